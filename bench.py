@@ -0,0 +1,1130 @@
+# --- 오프라인 벤치마크 (진짜 토큰이나 라이브 방송 없이 봇 성능 재기!) ---
+# 가짜 유튜브 API(search/videos/playlistItems + RSS)와 가짜 디스코드 채널을 bot.py에 끼워 넣고
+# 실제 check 로직(poll_live_channels_once, 확인 루프 check_youtube_live_status)과 on_message를 그대로 돌려 봐.
+#
+# 사용법:
+#   python bench.py                          # 모든 시나리오
+#   python bench.py poll --channels 500      # 채널 500개 라이브 확인
+#   python bench.py loop --duration 30       # 실제 확인 루프(채널별 일정 + 하루 예산)를 시간을 빨리 돌려서, 감지까지 걸린 시간과 쿼터
+#   python bench.py links --commands 300     # `!링크` 300개 동시에
+#   python bench.py flap --flap-rate 0.3     # 방송이 자주 켜졌다 꺼지는 상황
+#   python bench.py stats --history 3000     # 채널마다 지난 영상 3000개 백필 후 `!통계`
+#   python bench.py router --messages 200000 # 일반 채팅이 섞인 메시지를 on_message가 초당 몇 개 처리하는지
+#   python bench.py urls                     # 유튜브 링크 추출 회귀 확인 (틀리면 종료 코드 1)
+#   python bench.py scaleout --processes 3   # 로컬 프로세스 여러 개가 SQLite 임대로 채널을 나누고, 하나가 죽으면 넘겨받는지
+#   python bench.py websub                   # 로컬 가짜 허브로 구독 → 확인(challenge) → 서명된 푸시 → 바로 확인까지 (틀리면 종료 코드 1)
+#   python bench.py --latency-ms 120 --error-rate 0.02 --json
+#   python bench.py links --trace-memory     # 파이썬 힙 최대 사용량도 (시간은 재지 않는 두 번째 실행에서 따로 재)
+#
+# 배포 전에 확장 관련 변경이 정말 빨라졌는지 여기서 먼저 확인해 줘.
+import argparse
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+
+from aiohttp import ClientSession, web
+
+import bot
+
+# --- 가짜 유튜브 ---
+class FakeYouTubeError(Exception):
+    pass
+
+class FakeYouTubeWorld:
+    # 채널마다 영상 목록을 들고 있고, 어떤 영상이 방송 중인지 기억해.
+    # API 호출은 스레드 풀에서 오니까 공유 상태는 락으로 지켜.
+    def __init__(self, channel_count, videos_per_channel=15, latency_ms=50, jitter_ms=20,
+                 error_rate=0.0, rss_latency_ms=30, seed=0):
+        self.rng = random.Random(seed)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rss_latency = rss_latency_ms / 1000
+        self.lock = threading.Lock()
+        self.quota_used = 0
+        self.calls = {}
+        self.errors = 0
+        self.channels = {}
+        self.videos = {}
+        # 지난 영상은 하루에 하나씩, 가장 최근 영상이 어제쯤 되게 과거로 깔아 둬.
+        base = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0) \
+            - datetime.timedelta(days=videos_per_channel + 1)
+        for c in range(channel_count):
+            channel_id = f'UC{c:022d}'
+            video_ids = []
+            for v in range(videos_per_channel):
+                video_id = f'{c:06d}v{v:04d}'
+                start = base + datetime.timedelta(days=v, hours=c % 24)
+                self.videos[video_id] = {
+                    'channel_id': channel_id,
+                    'title': f'방송 {c}-{v}',
+                    'state': 'ended' if v % 3 else 'vod',
+                    'start': start,
+                    'end': start + datetime.timedelta(hours=2, minutes=v),
+                }
+                video_ids.append(video_id)
+            self.channels[channel_id] = video_ids
+
+    def _simulate_call(self, method, latency):
+        time.sleep(max(0.0, latency + self.rng.uniform(-self.jitter, self.jitter)))
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.quota_used += bot.QUOTA_COSTS.get(method, 0)
+            if self.rng.random() < self.error_rate:
+                self.errors += 1
+                raise FakeYouTubeError(f'{method}: 가짜 500 오류')
+
+    def _item(self, video_id):
+        video = self.videos[video_id]
+        iso = lambda dt: dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        item = {'id': video_id, 'snippet': {'title': video['title'], 'channelId': video['channel_id']}}
+        if video['state'] == 'live':
+            item['liveStreamingDetails'] = {'actualStartTime': iso(video['start'])}
+        elif video['state'] == 'upcoming':
+            item['liveStreamingDetails'] = {'scheduledStartTime': iso(video['start'])}
+        elif video['state'] == 'ended':
+            item['liveStreamingDetails'] = {'actualStartTime': iso(video['start']), 'actualEndTime': iso(video['end'])}
+        return item
+
+    def videos_list(self, id, **kwargs):
+        with self.lock:
+            items = [self._item(video_id) for video_id in id.split(',') if video_id in self.videos]
+        return {'items': items}
+
+    def search_list(self, channelId=None, eventType=None, **kwargs):
+        with self.lock:
+            items = [
+                {'id': {'videoId': video_id}}
+                for video_id in self.channels.get(channelId, [])
+                if eventType != 'live' or self.videos[video_id]['state'] == 'live'
+            ]
+        return {'items': items[:kwargs.get('maxResults', 5)]}
+
+    def playlist_items_list(self, playlistId, maxResults=5, pageToken=None, **kwargs):
+        # 최신 업로드부터 maxResults개씩. 페이지 토큰은 그냥 위치 숫자야.
+        channel_id = 'UC' + playlistId[2:]
+        offset = int(pageToken or 0)
+        with self.lock:
+            uploads = list(reversed(self.channels.get(channel_id, [])))
+            page = uploads[offset:offset + maxResults]
+            items = [
+                {'contentDetails': {'videoId': video_id,
+                                    'videoPublishedAt': self.videos[video_id]['start'].strftime('%Y-%m-%dT%H:%M:%SZ')}}
+                for video_id in page
+            ]
+        response = {'items': items}
+        if offset + maxResults < len(uploads):
+            response['nextPageToken'] = str(offset + maxResults)
+        return response
+
+    def rss(self, channel_id):
+        # RSS는 쿼터를 안 쓰니까 지연만 흉내 내.
+        time.sleep(self.rss_latency)
+        with self.lock:
+            self.calls['rss'] = self.calls.get('rss', 0) + 1
+            return list(reversed(self.channels[channel_id]))[:bot.CANDIDATES_PER_CHANNEL]
+
+    def go_live(self, channel_id):
+        # 채널에 새 영상을 올리고 방송을 시작해.
+        with self.lock:
+            video_id = f'{len(self.videos):06d}L{channel_id[-4:]}'
+            self.videos[video_id] = {
+                'channel_id': channel_id,
+                'title': f'라이브 {video_id}',
+                'state': 'live',
+                'start': datetime.datetime.now(datetime.timezone.utc),
+                'end': None,
+            }
+            self.channels[channel_id].append(video_id)
+            return video_id
+
+    def schedule_live(self, channel_id, start):
+        # 대기실(예정된 방송)을 만들어 둬. start_scheduled()로 방송을 시작해.
+        with self.lock:
+            video_id = f'{len(self.videos):06d}S{channel_id[-4:]}'
+            self.videos[video_id] = {
+                'channel_id': channel_id,
+                'title': f'예정 {video_id}',
+                'state': 'upcoming',
+                'start': start,
+                'end': None,
+            }
+            self.channels[channel_id].append(video_id)
+            return video_id
+
+    def start_scheduled(self, video_id):
+        with self.lock:
+            self.videos[video_id]['state'] = 'live'
+            self.videos[video_id]['start'] = datetime.datetime.now(datetime.timezone.utc)
+
+    def end_live(self, video_id):
+        with self.lock:
+            self.videos[video_id]['state'] = 'ended'
+            self.videos[video_id]['end'] = datetime.datetime.now(datetime.timezone.utc)
+
+    def live_video_ids(self):
+        with self.lock:
+            return {video_id for video_id, video in self.videos.items() if video['state'] == 'live'}
+
+    def ended_video_ids(self):
+        return [video_id for video_id, video in self.videos.items() if video['state'] == 'ended']
+
+class FakeRequest:
+    def __init__(self, world, method, handler, kwargs):
+        self.world = world
+        self.methodId = 'youtube.' + method # 진짜 HttpRequest처럼 지표에서 메서드 이름을 읽을 수 있게
+        self.method = method
+        self.handler = handler
+        self.kwargs = kwargs
+
+    def execute(self, http=None):
+        self.world._simulate_call(self.method, self.world.latency)
+        return self.handler(**self.kwargs)
+
+class FakeResource:
+    def __init__(self, world, method, handler):
+        self.world = world
+        self.method = method
+        self.handler = handler
+
+    def list(self, **kwargs):
+        return FakeRequest(self.world, self.method, self.handler, kwargs)
+
+class FakeYouTubeService:
+    def __init__(self, world):
+        self.world = world
+
+    def videos(self):
+        return FakeResource(self.world, 'videos.list', self.world.videos_list)
+
+    def search(self):
+        return FakeResource(self.world, 'search.list', self.world.search_list)
+
+    def playlistItems(self):
+        return FakeResource(self.world, 'playlistItems.list', self.world.playlist_items_list)
+
+# --- 가짜 디스코드 ---
+class FakeDiscordChannel:
+    def __init__(self, channel_id, latency_ms=80):
+        self.id = channel_id
+        self.name = f'fake-{channel_id}'
+        self.latency = latency_ms / 1000
+        self.sent = []
+
+    async def send(self, content):
+        await asyncio.sleep(self.latency)
+        self.sent.append(content)
+
+class FakeDiscordClient:
+    def __init__(self):
+        self.user = object()
+        self.channels = {}
+
+    def add_channel(self, channel):
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def is_closed(self):
+        return False
+
+    async def wait_until_ready(self):
+        return None
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeMessage:
+    def __init__(self, content, channel, author='user', guild_id=1):
+        self.content = content
+        self.channel = channel
+        self.author = author
+        self.attachments = []
+        self.guild = FakeGuild(guild_id)
+
+# --- 측정 도구 ---
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(ratio * (len(ordered) - 1))))]
+
+class LoopLagSampler:
+    # 벤치마크 중에 이벤트 루프가 얼마나 막히는지 10ms마다 재.
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+def install_fakes(world, args):
+    # bot.py의 전역 의존성을 가짜로 바꿔 끼워.
+    service = FakeYouTubeService(world)
+    bot.get_authenticated_service_instance = lambda: service
+    bot.fetch_recent_video_ids_from_rss = world.rss
+    bot.youtube_api = bot.AsyncYouTube(max_workers=args.workers, timeout=args.timeout)
+    bot.feed_http = bot.AsyncYouTube(max_workers=args.feed_workers, timeout=args.timeout, name='feed-http')
+    bot.video_info_cache = bot.VideoInfoCache()
+    bot.state_store = None
+    bot.live_sessions = {}
+    bot.live_checked_at = {}
+    bot.broadcast_stats = bot.BroadcastStats()
+    bot.broadcast_backfill = {}
+    client = FakeDiscordClient()
+    bot.client = client
+    bot.notifier = bot.NotificationDispatcher(concurrency=args.notify_concurrency)
+    alert_channels = [client.add_channel(FakeDiscordChannel(1000 + guild_id, args.discord_latency_ms))
+                      for guild_id in range(max(1, args.guilds))]
+    bot.alert_channels = {guild_id: channel.id for guild_id, channel in enumerate(alert_channels)}
+    return client, alert_channels
+
+def close_fakes():
+    bot.youtube_api.close()
+    bot.feed_http.close()
+
+def memory_report():
+    # tracemalloc은 켜 두면 전체가 몇 배 느려지니까 여기서는 RSS만 봐. (힙은 --trace-memory로 따로)
+    return {
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def latency_report(values):
+    return {
+        'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(max(values, default=0) * 1000, 1),
+    }
+
+# --- 시나리오 ---
+async def run_poll_scenario(args, flap_rate):
+    world = FakeYouTubeWorld(args.channels, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                             rss_latency_ms=args.rss_latency_ms, seed=args.seed)
+    client, alert_channels = install_fakes(world, args)
+    notifier_task = asyncio.ensure_future(bot.notifier.run())
+    channel_ids = list(world.channels)
+    rng = random.Random(args.seed)
+
+    cycle_latencies = []
+    cycle_quota = []
+    failed_cycles = 0
+    started_streams = 0
+    ended_streams = 0
+    with LoopLagSampler() as lag:
+        started = time.perf_counter()
+        for _ in range(args.cycles):
+            # 방송 켜기/끄기
+            live_now = world.live_video_ids()
+            for channel_id in channel_ids:
+                if rng.random() >= flap_rate:
+                    continue
+                channel_live = [v for v in live_now if world.videos[v]['channel_id'] == channel_id]
+                if channel_live:
+                    world.end_live(channel_live[0])
+                    ended_streams += 1
+                else:
+                    world.go_live(channel_id)
+                    started_streams += 1
+
+            cycle_started = time.perf_counter()
+            quota = bot.QuotaTally()
+            try:
+                await bot.poll_live_channels_once(bot.youtube_api, channel_ids, quota=quota)
+            except Exception:
+                failed_cycles += 1
+            cycle_latencies.append(time.perf_counter() - cycle_started)
+            cycle_quota.append(quota.units)
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+        # 확인 루프는 알림을 기다리지 않으니, 남은 알림이 다 나갈 때까지 따로 재.
+        drain_started = time.perf_counter()
+        await bot.notifier.drain()
+        drain_elapsed = time.perf_counter() - drain_started
+    notifier_task.cancel()
+
+    announcements = sum(len(channel.sent) for channel in alert_channels)
+    tracked_live = len(bot.live_sessions)
+    actually_live = len({world.videos[v]['channel_id'] for v in world.live_video_ids()})
+    close_fakes()
+    return {
+        'channels': args.channels,
+        'cycles': args.cycles,
+        'flap_rate': flap_rate,
+        'failed_cycles': failed_cycles,
+        'cycles_per_sec': round(args.cycles / elapsed, 2),
+        'channels_checked_per_sec': round(args.cycles * args.channels / elapsed, 1),
+        'cycle_latency': latency_report(cycle_latencies),
+        'quota_per_cycle': round(sum(cycle_quota) / len(cycle_quota), 1),
+        'quota_per_cycle_with_search_list': args.channels * bot.QUOTA_COSTS['search.list'],
+        'quota_total': world.quota_used,
+        'api_calls': dict(world.calls),
+        'api_errors': world.errors,
+        'streams_started': started_streams,
+        'streams_ended': ended_streams,
+        'alert_channels': len(alert_channels),
+        'announcements': announcements,
+        'notify_drain_ms': round(drain_elapsed * 1000, 1),
+        'tracked_live_channels': tracked_live,
+        'actual_live_channels': actually_live,
+        'event_loop_lag': latency_report(lag.samples),
+        'memory': memory_report(),
+    }
+
+async def run_links_scenario(args):
+    world = FakeYouTubeWorld(max(1, args.channels), latency_ms=args.latency_ms, error_rate=args.error_rate,
+                             rss_latency_ms=args.rss_latency_ms, seed=args.seed)
+    client, _ = install_fakes(world, args)
+    rng = random.Random(args.seed)
+    ended = world.ended_video_ids()
+    # 같은 다시보기 링크를 여러 명이 올리는 상황: 인기 영상 몇 개에 요청이 몰려.
+    popular = ended[:max(1, int(len(ended) * args.distinct_ratio))]
+
+    messages = []
+    for i in range(args.commands):
+        command_channel = client.add_channel(FakeDiscordChannel(2000 + i, args.discord_latency_ms))
+        if args.links_per_command == 1:
+            content = f'!링크 https://www.youtube.com/watch?v={rng.choice(popular)}'
+        else:
+            picked = rng.sample(ended, min(args.links_per_command, len(ended)))
+            content = '!링크\n' + '\n'.join(f'https://youtu.be/{video_id}' for video_id in picked)
+        messages.append(FakeMessage(content, command_channel))
+
+    command_latencies = []
+
+    async def handle(message):
+        started = time.perf_counter()
+        await bot.on_message(message)
+        command_latencies.append(time.perf_counter() - started)
+
+    with LoopLagSampler() as lag:
+        started = time.perf_counter()
+        await asyncio.gather(*(handle(message) for message in messages))
+        elapsed = time.perf_counter() - started
+
+    replies = sum(len(message.channel.sent) for message in messages)
+    errors = sum(1 for message in messages if any('문제가 발생' in text or '너무 늦어' in text for text in message.channel.sent))
+    close_fakes()
+    return {
+        'commands': args.commands,
+        'links_per_command': args.links_per_command,
+        'distinct_videos': len(popular) if args.links_per_command == 1 else len(ended),
+        'commands_per_sec': round(args.commands / elapsed, 1),
+        'command_latency': latency_report(command_latencies),
+        'replies': replies,
+        'failed_commands': errors,
+        'quota_total': world.quota_used,
+        'api_calls': dict(world.calls),
+        'cache': bot.video_info_cache.stats(),
+        'event_loop_lag': latency_report(lag.samples),
+        'memory': memory_report(),
+    }
+
+async def run_stats_scenario(args):
+    world = FakeYouTubeWorld(args.channels, videos_per_channel=args.history, latency_ms=args.latency_ms,
+                             error_rate=args.error_rate, rss_latency_ms=args.rss_latency_ms, seed=args.seed)
+    client, _ = install_fakes(world, args)
+    bot.STATS_BACKFILL_PAGE_DELAY_SECONDS = 0
+    channel_ids = list(world.channels)
+
+    # 1. 과거 기록 백필 (실제 봇처럼 채널을 하나씩)
+    with LoopLagSampler() as lag:
+        started = time.perf_counter()
+        for channel_id in channel_ids:
+            await bot.backfill_broadcast_history(bot.youtube_api, channel_id)
+        backfill_elapsed = time.perf_counter() - started
+    backfill_quota = world.quota_used
+    backfill_calls = dict(world.calls)
+
+    # 2. 재시작 뒤 따라잡기: 마지막으로 훑은 시점 근처까지만 봐야 해.
+    started = time.perf_counter()
+    for channel_id in channel_ids:
+        await bot.backfill_broadcast_history(bot.youtube_api, channel_id)
+    catchup_elapsed = time.perf_counter() - started
+    catchup_quota = world.quota_used - backfill_quota
+
+    # 3. `!통계` 질의 (API를 부르면 안 돼)
+    calls_before = sum(world.calls.values())
+    command_channel = client.add_channel(FakeDiscordChannel(3000, 0))
+    periods = ['', ' 일', ' 주', ' 월']
+    query_latencies = []
+    for i in range(args.commands):
+        message = FakeMessage(f'!통계{periods[i % len(periods)]} {channel_ids[i % len(channel_ids)]}', command_channel)
+        started = time.perf_counter()
+        await bot.on_message(message)
+        query_latencies.append(time.perf_counter() - started)
+    close_fakes()
+    return {
+        'channels': args.channels,
+        'uploads_per_channel': args.history,
+        'broadcasts_stored': len(bot.broadcast_stats),
+        'backfill_seconds': round(backfill_elapsed, 2),
+        'backfill_quota': backfill_quota,
+        'backfill_api_calls': backfill_calls,
+        'catchup_seconds': round(catchup_elapsed, 2),
+        'catchup_quota': catchup_quota,
+        'queries': args.commands,
+        'query_latency': latency_report(query_latencies),
+        'query_api_calls': sum(world.calls.values()) - calls_before,
+        'event_loop_lag': latency_report(lag.samples),
+        'memory': memory_report(),
+    }
+
+# 확인 루프 시나리오에서 빨리 돌릴 간격 값들 (bot.py 전역 값 이름)
+LOOP_SCALED_INTERVALS = (
+    'CHECK_INTERVAL_SECONDS', 'LIVE_POLL_INTERVAL_SECONDS', 'SCHEDULED_POLL_INTERVAL_SECONDS',
+    'SCHEDULED_WINDOW_SECONDS', 'SCHEDULED_GRACE_SECONDS', 'MAX_IDLE_POLL_INTERVAL_SECONDS',
+)
+
+async def run_loop_scenario(args):
+    # poll 시나리오는 한 주기만 재지만, 여기서는 실제 check_youtube_live_status를 그대로 띄워서
+    # PollScheduler(채널별 간격)와 QuotaBudget(하루 예산)까지 같이 돌려 봐.
+    # 간격과 예산을 --time-scale배 빠르게 해서 --duration초 동안 (봇 시간으로는 duration × time_scale초) 돌려.
+    # 가짜 API 지연은 그대로라서 감지 시간에는 (지연 × time_scale)만큼 더 붙어.
+    scale = args.time_scale
+    world = FakeYouTubeWorld(args.channels, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                             rss_latency_ms=args.rss_latency_ms, seed=args.seed)
+    client, alert_channels = install_fakes(world, args)
+    channel_ids = list(world.channels)
+    rng = random.Random(args.seed)
+    saved_env = os.environ.get('YOUTUBE_CHANNEL_IDS')
+    saved = {name: getattr(bot, name) for name in LOOP_SCALED_INTERVALS + ('POLL_QUOTA_BUDGET_PER_DAY', 'QuotaBudget')}
+    os.environ['YOUTUBE_CHANNEL_IDS'] = ','.join(channel_ids)
+    for name in LOOP_SCALED_INTERVALS:
+        setattr(bot, name, getattr(bot, name) / scale)
+    bot.POLL_QUOTA_BUDGET_PER_DAY = args.poll_budget
+    budget_pauses = []
+
+    class CountingQuotaBudget(saved['QuotaBudget']):
+        # 예산은 시계만 빠르게 돌려. (한 번에 몰아 쓸 수 있는 양은 그대로 1시간 분량)
+        def __init__(self, units_per_day):
+            super().__init__(units_per_day, clock=lambda: time.monotonic() * scale)
+
+        def wait_time(self):
+            wait_seconds = super().wait_time()
+            if wait_seconds > 0:
+                budget_pauses.append(wait_seconds)
+            return wait_seconds / scale # 확인 루프는 진짜 시간으로 자
+
+    bot.QuotaBudget = CountingQuotaBudget
+
+    # 방송 계획: 채널 10개 중 하나꼴로, 절반은 예고 없이 시작하고 절반은 대기실을 만들어 두고 예정 시간에 시작해.
+    duration = args.duration
+    streams = [] # {'channel_id', 'video_id', 'scheduled', 'start_at', 'end_at', 'live_at', 'detected', 'ended', 'end_detected'}
+
+    def announced(video_id):
+        # 확인 사이에 시작했다가 끝난 방송은 세션 없이 시작/종료 합친 알림만 나가.
+        return any(video_id in text for channel in alert_channels for text in channel.sent)
+    started = time.perf_counter()
+    for channel_id in rng.sample(channel_ids, max(1, len(channel_ids) // 10)):
+        start_at = rng.uniform(0.2, 0.6) * duration
+        stream = {'channel_id': channel_id, 'scheduled': rng.random() < 0.5, 'start_at': start_at,
+                  'end_at': start_at + rng.uniform(0.1, 0.3) * duration, 'video_id': None,
+                  'live_at': None, 'detected': None, 'ended': None, 'end_detected': None}
+        if stream['scheduled']:
+            scheduled_start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=start_at)
+            stream['video_id'] = world.schedule_live(channel_id, scheduled_start)
+        streams.append(stream)
+
+    tasks = [asyncio.ensure_future(bot.notifier.run()), asyncio.ensure_future(bot.check_youtube_live_status())]
+    try:
+        while (now := time.perf_counter() - started) < duration:
+            for stream in streams:
+                if stream['live_at'] is None and now >= stream['start_at']:
+                    if stream['scheduled']:
+                        world.start_scheduled(stream['video_id'])
+                    else:
+                        stream['video_id'] = world.go_live(stream['channel_id'])
+                    stream['live_at'] = now
+                elif stream['live_at'] is not None and stream['ended'] is None and now >= stream['end_at']:
+                    world.end_live(stream['video_id'])
+                    stream['ended'] = now
+                session = bot.live_sessions.get(stream['channel_id'])
+                if stream['live_at'] is not None and stream['detected'] is None and (
+                        session and session['video_id'] == stream['video_id'] or announced(stream['video_id'])):
+                    stream['detected'] = now
+                if stream['ended'] is not None and stream['end_detected'] is None and stream['detected'] is not None \
+                        and (not session or session['video_id'] != stream['video_id']):
+                    stream['end_detected'] = now
+            await asyncio.sleep(0.01)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        close_fakes()
+        for name, value in saved.items():
+            setattr(bot, name, value)
+        if saved_env is None:
+            os.environ.pop('YOUTUBE_CHANNEL_IDS', None)
+        else:
+            os.environ['YOUTUBE_CHANNEL_IDS'] = saved_env
+
+    def detect_report(pairs):
+        # 봇 시간(초) 기준으로 보여 줘.
+        latencies = [(found - happened) * scale for happened, found in pairs if found is not None]
+        return {
+            'count': len(pairs),
+            'not_detected_yet': sum(1 for _, found in pairs if found is None), # 끝날 때까지 못 찾은 것
+            'p50_s': round(percentile(latencies, 0.5), 1),
+            'max_s': round(max(latencies, default=0), 1),
+        }
+
+    simulated_hours = duration * scale / 3600
+    batches_per_check = -(-len(channel_ids) * bot.CANDIDATES_PER_CHANNEL // bot.VIDEOS_LIST_BATCH_SIZE)
+    return {
+        'channels': args.channels,
+        'time_scale': scale,
+        'simulated_minutes': round(duration * scale / 60, 1),
+        'unscheduled_start_detect': detect_report([(s['live_at'], s['detected']) for s in streams
+                                                   if not s['scheduled'] and s['live_at'] is not None]),
+        'scheduled_start_detect': detect_report([(s['live_at'], s['detected']) for s in streams
+                                                 if s['scheduled'] and s['live_at'] is not None]),
+        'end_detect': detect_report([(s['ended'], s['end_detected']) for s in streams
+                                     if s['ended'] is not None and s['detected'] is not None]),
+        'quota_total': world.quota_used,
+        'quota_per_hour': round(world.quota_used / simulated_hours, 1),
+        'quota_per_hour_every_60s': 60 * batches_per_check,
+        'poll_budget_per_hour': round(args.poll_budget / 24, 1),
+        'budget_pauses': len(budget_pauses),
+        'api_calls': dict(world.calls),
+        'announcements': sum(len(channel.sent) for channel in alert_channels),
+    }
+
+# --- 유튜브 링크 추출 회귀 확인 ---
+# (메시지, 찾아야 하는 영상 ID 목록). 추출 정규식을 고치면 `python bench.py urls`로 꼭 돌려 봐.
+URL_CASES = (
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('http://youtube.com/watch?v=dQw4w9WgXcQ&t=42s', ['dQw4w9WgXcQ']),
+    ('youtube.com/watch?v=dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/watch?app=desktop&list=PL123&v=dQw4w9WgXcQ&index=2', ['dQw4w9WgXcQ']),
+    ('https://m.youtube.com/watch?v=dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://music.youtube.com/watch?v=dQw4w9WgXcQ&list=RD', ['dQw4w9WgXcQ']),
+    ('https://youtu.be/dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://youtu.be/dQw4w9WgXcQ?si=abc&t=10', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/shorts/dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://youtube.com/shorts/dQw4w9WgXcQ?feature=share', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/live/dQw4w9WgXcQ?si=x', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/embed/dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/embed/dQw4w9WgXcQ?start=30', ['dQw4w9WgXcQ']),
+    ('https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/v/dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('https://www.youtube.com/attribution_link?a=x&u=/watch?v=dQw4w9WgXcQ', ['dQw4w9WgXcQ']),
+    ('오늘 방송 다시보기 https://youtu.be/dQw4w9WgXcQ 꼭 봐', ['dQw4w9WgXcQ']),
+    ('다시보기: <https://www.youtube.com/watch?v=dQw4w9WgXcQ>', ['dQw4w9WgXcQ']),
+    ('(https://www.youtube.com/embed/dQw4w9WgXcQ)', ['dQw4w9WgXcQ']),
+    ('a youtu.be/aaaaaaaaaaa b\nhttps://youtu.be/bbbbbbbbbbb\nyoutu.be/aaaaaaaaaaa', ['aaaaaaaaaaa', 'bbbbbbbbbbb']),
+    # 잡으면 안 되는 것
+    ('https://www.youtube.com/embed/videoseries?list=PLabcdefghijk', []),
+    ('https://www.youtube.com/embed/dQw4w9WgXcQxyz', []),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQx', []),
+    ('https://www.youtube.com/watch?xv=dQw4w9WgXcQ', []),
+    ('https://notyoutube.com/watch?v=dQw4w9WgXcQ', []),
+    ('https://example.com/watch?v=dQw4w9WgXcQ', []),
+    ('https://www.youtube.com/channel/UCabcdefghijklmnopqrstuv', []),
+    ('유튜브 링크 없음', []),
+)
+
+def run_url_cases():
+    failed = []
+    for text, expected in URL_CASES:
+        found = bot.extract_video_ids(text)
+        if found != expected:
+            failed.append({'text': text, 'expected': expected, 'found': found})
+    return {'cases': len(URL_CASES), 'failed': len(failed), 'failures': failed}
+
+# 실제 채팅방처럼 대부분은 명령어가 아닌 잡담이고, 링크 공유나 모르는 명령어가 조금 섞여 있어.
+CHAT_TRAFFIC = (
+    (0.70, lambda rng: rng.choice(['ㅋㅋㅋㅋㅋ', '오늘 방송 언제 해?', 'gg', '점심 뭐 먹지',
+                                   '방금 그 장면 레전드였다 진짜로', 'ㅇㅈ', 'Good morning everyone!'])),
+    (0.15, lambda rng: f"이거 봐 https://www.youtube.com/watch?v={rng_video_id(rng)}&t=42s 진짜 웃김"),
+    (0.05, lambda rng: f"https://youtu.be/{rng_video_id(rng)} https://youtube.com/shorts/{rng_video_id(rng)}"),
+    (0.05, lambda rng: rng.choice(['!play 노래', '!rank', '!안녕하세요', '!help'])),
+    (0.05, lambda rng: '!안녕'),
+)
+
+def rng_video_id(rng):
+    return ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-') for _ in range(11))
+
+def make_chat_message(rng, channel):
+    roll = rng.random()
+    for weight, make in CHAT_TRAFFIC:
+        roll -= weight
+        if roll < 0:
+            break
+    return FakeMessage(make(rng), channel)
+
+async def run_router_scenario(args):
+    world = FakeYouTubeWorld(1, latency_ms=args.latency_ms, seed=args.seed)
+    client, _ = install_fakes(world, args)
+    rng = random.Random(args.seed)
+    chat_channel = client.add_channel(FakeDiscordChannel(4000, 0))
+    messages = [make_chat_message(rng, chat_channel) for _ in range(args.messages)]
+
+    # 1. on_message 전체 (명령어 찾기 + `!안녕` 답장)
+    started = time.perf_counter()
+    for message in messages:
+        await bot.on_message(message)
+    dispatch_elapsed = time.perf_counter() - started
+
+    # 2. 링크 추출만 따로 (`!링크`가 메시지 본문에서 하는 일)
+    texts = [message.content for message in messages]
+    started = time.perf_counter()
+    found = sum(len(bot.extract_video_ids(text)) for text in texts)
+    extract_elapsed = time.perf_counter() - started
+    close_fakes()
+    return {
+        'messages': args.messages,
+        'messages_per_sec': round(args.messages / dispatch_elapsed),
+        'replies': len(chat_channel.sent),
+        'extract_messages_per_sec': round(args.messages / extract_elapsed),
+        'video_ids_found': found,
+        'api_calls': sum(world.calls.values()),
+    }
+
+# --- 가짜 WebSub 허브 ---
+class FakeWebSubHub:
+    # 진짜 허브처럼 구독 요청을 받으면 콜백 주소로 GET 확인(challenge)을 보내고,
+    # publish()를 부르면 구독할 때 받은 비밀 값으로 서명한 Atom 피드를 POST로 보내.
+    def __init__(self, lease_seconds=3600):
+        self.lease_seconds = lease_seconds
+        self.subscriptions = {} # 채널 ID -> {'callback': ..., 'secret': ...}
+        self.verified = 0
+        self.failed_verifications = 0
+        self.url = None
+        self._runner = None
+        self._session = None
+        self._tasks = set()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/subscribe', self._handle_subscribe)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}/subscribe'
+        self._session = ClientSession()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await self._session.close()
+        await self._runner.cleanup()
+
+    async def _handle_subscribe(self, request):
+        form = await request.post()
+        # 확인은 응답을 돌려준 뒤에 따로 해. (hub.verify=async)
+        task = asyncio.ensure_future(self._verify(dict(form)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=202)
+
+    async def _verify(self, form):
+        channel_id = bot.channel_id_from_topic(form['hub.topic'])
+        challenge = os.urandom(8).hex()
+        status, body = await self.verify(form['hub.callback'], form['hub.mode'], form['hub.topic'], challenge)
+        if status == 200 and body == challenge:
+            self.verified += 1
+            self.subscriptions[channel_id] = {'callback': form['hub.callback'], 'secret': form.get('hub.secret', '')}
+        else:
+            self.failed_verifications += 1
+
+    async def verify(self, callback, mode, topic, challenge):
+        query = {'hub.mode': mode, 'hub.topic': topic, 'hub.challenge': challenge,
+                 'hub.lease_seconds': str(self.lease_seconds)}
+        async with self._session.get(callback + '?' + urllib.parse.urlencode(query)) as response:
+            return response.status, await response.text()
+
+    @staticmethod
+    def feed(video_id, channel_id):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+            f'<entry><id>yt:video:{video_id}</id><yt:videoId>{video_id}</yt:videoId>'
+            f'<yt:channelId>{channel_id}</yt:channelId><title>bench</title></entry></feed>'
+        ).encode('utf-8')
+
+    async def publish(self, channel_id, video_id, claimed_channel_id=None, signature=None):
+        # signature를 주면 그 값을 그대로 (가짜 서명), ''이면 서명 없이 보내.
+        subscription = self.subscriptions[claimed_channel_id or channel_id]
+        body = self.feed(video_id, claimed_channel_id or channel_id)
+        if signature is None:
+            signature = 'sha1=' + hmac.new(subscription['secret'].encode('utf-8'), body, hashlib.sha1).hexdigest()
+        headers = {'Content-Type': 'application/atom+xml'}
+        if signature:
+            headers['X-Hub-Signature'] = signature
+        async with self._session.post(subscription['callback'], data=body, headers=headers) as response:
+            return response.status
+
+async def wait_until(predicate, timeout=10, interval=0.01):
+    started = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - started > timeout:
+            return None
+        await asyncio.sleep(interval)
+    return time.perf_counter() - started
+
+async def run_websub_scenario(args):
+    # 감시하는 채널 몇 개 + 감시 안 하는 채널 하나 (남의 방송을 우리 채널 것이라고 우기는 푸시용)
+    channel_count = max(2, min(args.channels, 20))
+    world = FakeYouTubeWorld(channel_count + 1, latency_ms=args.latency_ms, rss_latency_ms=args.rss_latency_ms,
+                             seed=args.seed)
+    client, alert_channels = install_fakes(world, args)
+    watched = list(world.channels)[:channel_count]
+    outsider = list(world.channels)[channel_count]
+    saved = (os.environ.get('YOUTUBE_CHANNEL_IDS'), bot.WEBSUB_HUB_URL, bot.WEBSUB_CALLBACK_URL, bot.WEBSUB_SECRET)
+    os.environ['YOUTUBE_CHANNEL_IDS'] = ','.join(watched)
+    bot.websub_leases.clear()
+    bot.websub_requested.clear()
+    bot.pushed_videos.clear()
+
+    hub = FakeWebSubHub()
+    await hub.start()
+    runner = web.AppRunner(bot.create_http_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    host, port = runner.addresses[0][:2]
+    bot.WEBSUB_HUB_URL = hub.url
+    bot.WEBSUB_CALLBACK_URL = f'http://{host}:{port}/websub'
+    bot.WEBSUB_SECRET = 'bench-secret'
+    tasks = []
+    try:
+        # 1. 구독 요청 → 허브가 GET으로 확인 → 구독 기간 기록
+        tasks.append(asyncio.ensure_future(bot.renew_websub_subscriptions()))
+        subscribe_seconds = await wait_until(lambda: all(bot.websub_lease_active(c) for c in watched))
+        # 요청하지 않은 구독 확인은 거절해야 해.
+        outsider_topic = bot.WEBSUB_TOPIC_URL.format(channel_id=outsider)
+        unsolicited_status, _ = await hub.verify(bot.WEBSUB_CALLBACK_URL, 'subscribe', outsider_topic, 'nope')
+        repeat_status, _ = await hub.verify(bot.WEBSUB_CALLBACK_URL, 'subscribe',
+                                            bot.WEBSUB_TOPIC_URL.format(channel_id=watched[0]), 'again')
+
+        # 2. 라이브 확인 루프를 띄우고 첫 확인이 끝나길 기다려 (그 뒤로는 조용한 채널이라 한참 안 봐)
+        tasks.append(asyncio.ensure_future(bot.notifier.run()))
+        tasks.append(asyncio.ensure_future(bot.check_youtube_live_status()))
+        await wait_until(lambda: all(c in bot.live_checked_at for c in watched))
+        calls_before = dict(world.calls)
+
+        def announced():
+            return sum(len(channel.sent) for channel in alert_channels)
+
+        # 3. 서명 없는 푸시, 틀린 서명 푸시는 무시해야 해
+        live_video = world.go_live(watched[0])
+        unsigned_status = await hub.publish(watched[0], live_video, signature='')
+        unsigned_ignored = live_video not in bot.pushed_videos
+        bad_status = await hub.publish(watched[0], live_video, signature='sha1=' + '0' * 40)
+        bad_signature_ignored = live_video not in bot.pushed_videos
+
+        # 4. 서명은 맞지만 다른 채널 방송을 우리 채널이라고 우기면 확인 단계에서 걸러져야 해
+        foreign_video = world.go_live(outsider)
+        last_checked = bot.live_checked_at[watched[1]]
+        await hub.publish(outsider, foreign_video, claimed_channel_id=watched[1])
+        await wait_until(lambda: bot.live_checked_at[watched[1]] != last_checked)
+        await bot.notifier.drain()
+        foreign_announced = watched[1] in bot.live_sessions or any(
+            foreign_video in text for channel in alert_channels for text in channel.sent)
+
+        # 5. 제대로 서명된 푸시는 라이브 확인 루프를 바로 깨워서 알림까지 가
+        published = time.perf_counter()
+        signed_status = await hub.publish(watched[0], live_video)
+        detect_seconds = await wait_until(lambda: announced() > 0)
+        push_calls = {method: count - calls_before.get(method, 0) for method, count in world.calls.items()}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await runner.cleanup()
+        await hub.stop()
+        close_fakes()
+        if saved[0] is None:
+            os.environ.pop('YOUTUBE_CHANNEL_IDS', None)
+        else:
+            os.environ['YOUTUBE_CHANNEL_IDS'] = saved[0]
+        bot.WEBSUB_HUB_URL, bot.WEBSUB_CALLBACK_URL, bot.WEBSUB_SECRET = saved[1:]
+        bot.pushed_videos.clear()
+
+    checks = {
+        'all_subscriptions_verified': hub.verified == channel_count,
+        'unsolicited_verify_refused': unsolicited_status == 404,
+        'unsigned_push_ignored': unsigned_ignored,
+        'bad_signature_push_ignored': bad_signature_ignored,
+        'foreign_video_not_announced': not foreign_announced,
+        'signed_push_announced': detect_seconds is not None,
+    }
+    return {
+        'channels': channel_count,
+        'failed_checks': [name for name, ok in checks.items() if not ok],
+        'subscriptions_verified': hub.verified,
+        'subscribe_seconds': round(subscribe_seconds, 2) if subscribe_seconds is not None else None,
+        'unsolicited_verify_status': unsolicited_status,
+        'repeat_verify_status': repeat_status,
+        'unsigned_push_status': unsigned_status,
+        'unsigned_push_ignored': unsigned_ignored,
+        'bad_signature_push_status': bad_status,
+        'bad_signature_push_ignored': bad_signature_ignored,
+        'foreign_video_announced': foreign_announced,
+        'signed_push_status': signed_status,
+        'push_to_alert_ms': round(detect_seconds * 1000, 1) if detect_seconds is not None else None,
+        'api_calls_after_push': push_calls,
+        'announcements': announced(),
+    }
+
+def scaleout_worker(db_path, worker_id, channel_ids, lease_seconds, renew_seconds, sample_path):
+    # 자식 프로세스: 실제 봇처럼 임대를 잡고 연장하면서, 지금 확인할 수 있는 채널을 계속 기록해.
+    # SIGTERM을 받으면 봇의 close_on_signal → stop_services처럼 임대를 내려놓아.
+    os.environ['YOUTUBE_CHANNEL_IDS'] = ','.join(channel_ids)
+    bot.LEASE_SAFETY_SECONDS = lease_seconds / 5
+    bot.coordinator = bot.ChannelLeaseCoordinator(db_path, worker_id, lease_seconds)
+    bot.state_store = None
+
+    async def main():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        next_sync = 0
+        with open(sample_path, 'a') as samples:
+            while not stop.is_set():
+                if time.time() >= next_sync:
+                    try:
+                        await bot.sync_channel_leases()
+                    except sqlite3.OperationalError:
+                        pass # DB가 잠깐 잠겨 있으면 다음에 다시
+                    next_sync = time.time() + renew_seconds
+                samples.write(json.dumps([time.time(), worker_id, bot.owned_channel_ids()]) + '\n')
+                samples.flush()
+                try:
+                    await asyncio.wait_for(stop.wait(), 0.05)
+                except asyncio.TimeoutError:
+                    pass
+        await bot.leave_cluster()
+
+    asyncio.run(main())
+
+def lease_owners(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return dict(conn.execute('SELECT youtube_channel_id, owner FROM channel_leases WHERE expires_ts > ?', (time.time(),)))
+    finally:
+        conn.close()
+
+def find_double_owners(sample_paths):
+    # 같은 채널을 두 프로세스가 동시에 "내 것"이라고 본 구간이 있는지 찾아.
+    intervals = {} # (채널, 프로세스) -> [[시작, 끝], ...]
+    for path in sample_paths:
+        last = {}
+        with open(path) as samples:
+            for line in samples:
+                ts, worker_id, owned = json.loads(line)
+                owned = set(owned)
+                for channel_id in owned:
+                    spans = intervals.setdefault((channel_id, worker_id), [])
+                    if last.get(channel_id):
+                        spans[-1][1] = ts
+                    else:
+                        spans.append([ts, ts])
+                last = {channel_id: True for channel_id in owned}
+    by_channel = {}
+    for (channel_id, worker_id), spans in intervals.items():
+        by_channel.setdefault(channel_id, []).extend((start, end, worker_id) for start, end in spans)
+    overlaps = 0
+    for spans in by_channel.values():
+        spans.sort()
+        for (start_a, end_a, worker_a), (start_b, end_b, worker_b) in zip(spans, spans[1:]):
+            if worker_a != worker_b and start_b < end_a:
+                overlaps += 1
+    return overlaps
+
+async def wait_for_owners(db_path, channel_ids, alive, timeout=60):
+    # 모든 채널이 살아 있는 프로세스의 임대로 덮일 때까지 기다린 시간을 재.
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        owners = lease_owners(db_path)
+        if all(owners.get(channel_id) in alive for channel_id in channel_ids):
+            return time.perf_counter() - started, owners
+        await asyncio.sleep(0.05)
+    raise TimeoutError('임대가 제시간에 정리되지 않았어')
+
+async def run_scaleout_scenario(args):
+    context = multiprocessing.get_context('spawn')
+    channel_ids = [f'UC{c:022d}' for c in range(args.channels)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, 'cluster.db')
+        bot.ChannelLeaseCoordinator(db_path, 'setup').close() # 테이블을 먼저 만들어 둬
+        processes = {}
+        sample_paths = []
+
+        def spawn(worker_id):
+            sample_path = os.path.join(work_dir, f'{worker_id}.jsonl')
+            sample_paths.append(sample_path)
+            process = context.Process(target=scaleout_worker, args=(
+                db_path, worker_id, channel_ids, args.lease_seconds, args.renew_seconds, sample_path))
+            process.start()
+            processes[worker_id] = process
+
+        # 1. 프로세스 여러 개가 채널을 나눠 가져
+        for i in range(args.processes):
+            spawn(f'worker-{i}')
+        await asyncio.sleep(args.lease_seconds) # 모두 하트비트를 남길 때까지
+        converge_seconds, owners = await wait_for_owners(db_path, channel_ids, set(processes))
+        await asyncio.sleep(2 * args.renew_seconds) # 늦게 들어온 프로세스 몫이 넘어가기까지
+        _, owners = await wait_for_owners(db_path, channel_ids, set(processes))
+        share = {worker_id: 0 for worker_id in processes}
+        for owner in owners.values():
+            share[owner] += 1
+
+        # 2. 하나를 강제로 죽이면 (SIGKILL) 임대가 만료된 뒤 남은 프로세스가 넘겨받아
+        killed = 'worker-0'
+        processes[killed].kill()
+        processes[killed].join()
+        del processes[killed]
+        takeover_seconds, owners = await wait_for_owners(db_path, channel_ids, set(processes))
+
+        # 3. 정상 종료(SIGTERM)는 임대를 바로 내려놓아서 더 빨리 넘어가
+        stopped = sorted(processes)[0]
+        processes[stopped].terminate()
+        processes[stopped].join()
+        del processes[stopped]
+        handoff_seconds, owners = await wait_for_owners(db_path, channel_ids, set(processes))
+
+        # 4. 새 프로세스가 들어오면 일관된 해싱 덕분에 일부 채널만 옮겨 가
+        before_join = owners
+        spawn(f'worker-{args.processes}')
+        await asyncio.sleep(args.lease_seconds + 3 * args.renew_seconds)
+        _, owners = await wait_for_owners(db_path, channel_ids, set(processes))
+        moved = sum(1 for channel_id in channel_ids if owners.get(channel_id) != before_join.get(channel_id))
+
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        overlaps = find_double_owners(sample_paths)
+
+    return {
+        'channels': args.channels,
+        'processes': args.processes,
+        'lease_seconds': args.lease_seconds,
+        'renew_seconds': args.renew_seconds,
+        'converge_seconds': round(converge_seconds, 2),
+        'channels_per_process': share,
+        'takeover_after_kill_seconds': round(takeover_seconds, 2),
+        'handoff_after_stop_seconds': round(handoff_seconds, 2),
+        'moved_on_join': moved,
+        'double_owned_intervals': overlaps,
+    }
+
+SCENARIOS = ('poll', 'loop', 'links', 'flap', 'stats', 'router', 'scaleout', 'urls', 'websub')
+
+async def run_scenario(args, scenario):
+    if scenario == 'poll':
+        return await run_poll_scenario(args, args.poll_flap_rate)
+    if scenario == 'flap':
+        return await run_poll_scenario(args, args.flap_rate)
+    if scenario == 'loop':
+        return await run_loop_scenario(args)
+    if scenario == 'stats':
+        return await run_stats_scenario(args)
+    if scenario == 'router':
+        return await run_router_scenario(args)
+    if scenario == 'scaleout':
+        return await run_scaleout_scenario(args)
+    if scenario == 'urls':
+        return run_url_cases()
+    if scenario == 'websub':
+        return await run_websub_scenario(args)
+    return await run_links_scenario(args)
+
+async def run(args):
+    results = {}
+    for scenario in (SCENARIOS if args.scenario == 'all' else (args.scenario,)):
+        results[scenario] = await run_scenario(args, scenario)
+        if args.trace_memory and 'memory' in results[scenario]:
+            # 시간 측정에 tracemalloc 부담이 섞이지 않게, 힙은 같은 시나리오를 한 번 더 돌려서 따로 재.
+            tracemalloc.start()
+            await run_scenario(args, scenario)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[scenario]['memory']['python_peak_mb'] = round(peak / 1024 / 1024, 2)
+    return results
+
+def print_results(results):
+    def show(prefix, value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                show(f'{prefix}.{key}' if prefix else key, inner)
+        else:
+            print(f'  {prefix:<40} {value}')
+    for scenario, result in results.items():
+        print(f'[{scenario}]')
+        show('', result)
+
+def main():
+    parser = argparse.ArgumentParser(description='가짜 유튜브/디스코드로 봇 성능을 재는 오프라인 벤치마크')
+    parser.add_argument('scenario', nargs='?', default='all', choices=('all',) + SCENARIOS)
+    parser.add_argument('--channels', type=int, default=100, help='감시할 유튜브 채널 수')
+    parser.add_argument('--cycles', type=int, default=20, help='라이브 확인 주기 수')
+    parser.add_argument('--commands', type=int, default=200, help='동시에 보낼 `!링크` 명령 수')
+    parser.add_argument('--links-per-command', type=int, default=1, help='`!링크` 하나에 넣을 링크 수')
+    parser.add_argument('--distinct-ratio', type=float, default=0.05, help='`!링크`에 쓰일 서로 다른 영상 비율')
+    parser.add_argument('--poll-flap-rate', type=float, default=0.02, help='poll 시나리오에서 주기마다 방송 상태가 바뀔 확률')
+    parser.add_argument('--flap-rate', type=float, default=0.3, help='flap 시나리오에서 주기마다 방송 상태가 바뀔 확률')
+    parser.add_argument('--duration', type=float, default=30, help='loop 시나리오를 돌릴 시간 (초)')
+    parser.add_argument('--time-scale', type=float, default=60, help='loop 시나리오에서 확인 간격과 예산을 몇 배 빠르게 돌릴지')
+    parser.add_argument('--poll-budget', type=int, default=bot.POLL_QUOTA_BUDGET_PER_DAY, help='loop 시나리오의 하루 라이브 확인 쿼터 예산')
+    parser.add_argument('--history', type=int, default=1000, help='stats 시나리오에서 채널마다 쌓인 지난 영상 수')
+    parser.add_argument('--messages', type=int, default=200000, help='router 시나리오에서 처리할 채팅 메시지 수')
+    parser.add_argument('--processes', type=int, default=3, help='scaleout 시나리오에서 띄울 봇 프로세스 수')
+    parser.add_argument('--lease-seconds', type=float, default=3, help='scaleout 시나리오의 임대 유효 시간')
+    parser.add_argument('--renew-seconds', type=float, default=1, help='scaleout 시나리오의 임대 연장 간격')
+    parser.add_argument('--latency-ms', type=float, default=50, help='가짜 유튜브 API 지연')
+    parser.add_argument('--rss-latency-ms', type=float, default=30, help='가짜 RSS 지연')
+    parser.add_argument('--discord-latency-ms', type=float, default=80, help='가짜 디스코드 전송 지연')
+    parser.add_argument('--guilds', type=int, default=1, help='알림을 받을 디스코드 서버(채널) 수')
+    parser.add_argument('--notify-concurrency', type=int, default=bot.NOTIFY_CONCURRENCY, help='동시에 알림을 보낼 채널 수')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='가짜 유튜브 API 오류 확률')
+    parser.add_argument('--workers', type=int, default=bot.YOUTUBE_API_MAX_WORKERS, help='유튜브 API 스레드 수')
+    parser.add_argument('--feed-workers', type=int, default=bot.FEED_HTTP_MAX_WORKERS, help='RSS 요청 스레드 수')
+    parser.add_argument('--timeout', type=float, default=bot.YOUTUBE_API_TIMEOUT_SECONDS, help='API 요청 제한 시간')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='파이썬 힙 최대 사용량을 따로 한 번 더 돌려서 재')
+    parser.add_argument('--json', action='store_true', help='결과를 JSON으로 출력')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_results(results)
+    if results.get('urls', {}).get('failed') or results.get('websub', {}).get('failed_checks'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,100 @@ import datetime
 import asyncio
 import os
 import re
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 import pickle
-from flask import Flask
-from threading import Thread
 import pytz
 import json
 import base64
+import urllib.request
+from xml.etree import ElementTree
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+import google_auth_httplib2
+import time
+from collections import OrderedDict
+import sqlite3
+import heapq
+import bisect
+import socket
+import signal
+import random
+import hmac
+import hashlib
+import urllib.parse
+import logging
+import sys
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from aiohttp import web # HTTP 서버 (discord.py도 쓰지만 우리가 직접 불러오니까 requirements.txt에 따로 적어 둬)
+# googleapiclient.discovery, google_auth_oauthlib.flow, google.auth.transport.requests는
+# 불러오는 데 시간이 꽤 걸려서 (합쳐서 0.2초 정도) 정말 필요할 때 함수 안에서 불러와.
+
+# --- 로그 설정 ---
+# LOG_LEVEL(DEBUG/INFO/WARNING...)로 얼마나 자세히 볼지, LOG_FORMAT=json이면 한 줄에 JSON 하나씩 찍어.
+# log.info(..., extra={'channel_id': ...})처럼 넘긴 값은 JSON 필드로 같이 나와서 검색하기 편해.
+log = logging.getLogger('time-bot')
+LOG_RECORD_BUILTIN_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in LOG_RECORD_BUILTIN_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging():
+    handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'text').lower() == 'json':
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(), handlers=[handler], force=True)
+
+# --- 지표 (/metrics 에서 Prometheus 형식으로 볼 수 있어) ---
+YOUTUBE_API_LATENCY = Histogram(
+    'youtube_api_request_seconds', '유튜브 API 요청 하나에 걸린 시간', ['method'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+YOUTUBE_API_ERRORS = Counter('youtube_api_errors_total', '실패한 유튜브 API 요청 수', ['method'])
+YOUTUBE_QUOTA_UNITS = Counter('youtube_quota_units_total', '사용한 유튜브 API 쿼터 (추정치)', ['method'])
+POLL_CYCLE_SECONDS = Histogram(
+    'live_poll_cycle_seconds', '라이브 확인 한 주기에 걸린 시간',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+POLL_CYCLE_ERRORS = Counter('live_poll_cycle_errors_total', '실패한 라이브 확인 주기 수')
+EVENT_LOOP_LAG = Gauge('event_loop_lag_seconds', '이벤트 루프가 늦게 깨어난 시간 (최근 측정값)')
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    'event_loop_lag_seconds_distribution', '이벤트 루프 지연 분포',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+DISCORD_SEND_LATENCY = Histogram(
+    'discord_send_seconds', '디스코드 메시지 전송에 걸린 시간', ['kind'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+DISCORD_SEND_FAILURES = Counter('discord_send_failures_total', '실패한 디스코드 메시지 전송 수', ['kind'])
+COMMANDS = Counter('bot_commands_total', '처리한 명령어 수', ['command'])
+TOKEN_REFRESHES = Counter('youtube_token_refreshes_total', '유튜브 인증 토큰 새로고침 횟수', ['result'])
+EVENT_LOOP_LAG_INTERVAL_SECONDS = 1 # 이벤트 루프 지연을 몇 초마다 잴지
+
+async def monitor_event_loop_lag():
+    # 1초 자고 일어났을 때 얼마나 늦게 일어났는지 = 그동안 루프를 막고 있던 시간
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        lag = max(0.0, loop.time() - started - EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+        if lag > 0.5:
+            log.warning(f"이벤트 루프가 {lag:.2f}초 막혀 있었어.", extra={'event_loop_lag': lag})
 
 # --- 봇 설정 값 (환경 변수에서 가져올 거야!) ---
 # 이 값은 Koyeb/Replit에서 설정할 DISCORD_TOKEN만 필요해.
@@ -23,7 +108,7 @@ DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
 # 만약 DISCORD_TOKEN이 없어도 client_secret.json이 있다면 인증 과정은 진행될 거야.
 # 배포 환경에서는 DISCORD_TOKEN이 필수적으로 설정되어야 해.
 if not DISCORD_TOKEN:
-    print("경고: DISCORD_TOKEN 환경 변수가 설정되지 않았습니다. 로컬 테스트 중이거나 배포 환경에서 설정이 필요합니다.")
+    log.warning("DISCORD_TOKEN 환경 변수가 설정되지 않았습니다. 로컬 테스트 중이거나 배포 환경에서 설정이 필요합니다.")
     # 로컬에서 첫 인증을 위해 실행할 때는 이 경고가 뜨더라도 계속 진행됩니다.
 
 # --- OAuth 인증 관련 설정 ---
@@ -32,363 +117,2364 @@ SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
 
 # 인증된 유튜브 서비스 객체를 저장할 전역 변수
 youtube_service = None
+youtube_credentials = None # 스레드마다 HTTP 연결을 따로 만들 때 필요한 인증 정보
 
-def get_authenticated_service_instance():
-    global youtube_service
-    if youtube_service: # 이미 인증되어 있다면 기존 서비스 객체 반환
-        return youtube_service
+# --- 인증 토큰 관리 ---
+# 토큰은 디스크에 임시 파일을 만들지 않고 메모리에서 바로 unpickle 해.
+# 액세스 토큰은 만료되기 전에 백그라운드에서 미리 새로고침해서, 요청하는 쪽은 기다리지도 실패하지도 않게!
+# TOKEN_STORE_PATH를 설정하면 새로고침된 토큰을 그 파일에 저장하고, 다음 시작 때 가장 먼저 읽어.
+TOKEN_STORE_PATH = os.environ.get('TOKEN_STORE_PATH')
+TOKEN_REFRESH_MARGIN_SECONDS = 5 * 60 # 만료 5분 전에 새로고침
+TOKEN_REFRESH_RETRY_SECONDS = 30 # 새로고침 실패 시 다시 시도할 때까지 기다릴 시간
+token_refresh_lock = threading.Lock() # 동시에 여러 곳에서 새로고침하지 않게 (스레드 풀에서도 부르니까 threading.Lock)
+
+def load_credentials_from_bytes(data):
+    return pickle.loads(data)
+
+def load_stored_credentials():
+    # 1. 우리가 새로고침해서 저장해 둔 토큰 (TOKEN_STORE_PATH)
+    if TOKEN_STORE_PATH and os.path.exists(TOKEN_STORE_PATH):
+        try:
+            with open(TOKEN_STORE_PATH, 'rb') as token:
+                credentials = load_credentials_from_bytes(token.read())
+            log.info(f"저장소({TOKEN_STORE_PATH})에서 인증 정보 불러오기 성공.")
+            return credentials
+        except Exception as e:
+            log.error(f"저장소({TOKEN_STORE_PATH}) 인증 정보 불러오기 오류: {e}.")
 
-    credentials = None
-    
-    # Replit Secrets에서 token.pickle 파일 내용 가져오기 시도
+    # 2. Replit Secrets에서 token.pickle 내용 가져오기 (Base64 디코딩해서 메모리에서 바로 읽어)
     token_pickle_base64 = os.environ.get('TOKEN_PICKLE_BASE64')
     if token_pickle_base64:
         try:
-            # Base64 디코딩하여 token.pickle 파일 생성 (임시)
-            decoded_token = base64.b64decode(token_pickle_base64)
-            # 임시 파일로 저장하여 pickle.load가 읽을 수 있도록 함
-            with open('temp_token.pickle', 'wb') as f:
-                f.write(decoded_token)
-            with open('temp_token.pickle', 'rb') as token:
-                credentials = pickle.load(token)
-            os.remove('temp_token.pickle') # 사용 후 임시 파일 삭제
-            print("Secrets에서 token.pickle 정보 불러오기 성공.")
+            credentials = load_credentials_from_bytes(base64.b64decode(token_pickle_base64))
+            log.info("Secrets에서 token.pickle 정보 불러오기 성공.")
+            return credentials
         except Exception as e:
-            print(f"Secrets에서 token.pickle 불러오기 오류: {e}. 새로 인증 필요.")
-            credentials = None
-    
-    # 로컬에 token.pickle 파일이 있다면 사용 (로컬 테스트용)
-    if not credentials and os.path.exists('token.pickle'):
-        print("로컬 token.pickle 파일에서 인증 정보를 불러오는 중...")
+            log.error(f"Secrets에서 token.pickle 불러오기 오류: {e}. 새로 인증 필요.")
+
+    # 3. 로컬에 token.pickle 파일이 있다면 사용 (로컬 테스트용)
+    if os.path.exists('token.pickle'):
+        log.info("로컬 token.pickle 파일에서 인증 정보를 불러오는 중...")
         try:
             with open('token.pickle', 'rb') as token:
-                credentials = pickle.load(token)
-            print("로컬 token.pickle 정보 불러오기 성공.")
+                credentials = load_credentials_from_bytes(token.read())
+            log.info("로컬 token.pickle 정보 불러오기 성공.")
+            return credentials
         except Exception as e:
-            print(f"로컬 token.pickle 로딩 중 오류 발생: {e}. 새로 인증 필요.")
-            credentials = None
+            log.error(f"로컬 token.pickle 로딩 중 오류 발생: {e}. 새로 인증 필요.")
+    return None
+
+def save_credentials(credentials):
+    # 새로고침된 토큰을 저장소에 저장 (쓰는 도중에 죽어도 깨지지 않게 임시 파일에 쓰고 바꿔치기)
+    if not TOKEN_STORE_PATH:
+        return
+    temp_path = TOKEN_STORE_PATH + '.tmp'
+    with open(temp_path, 'wb') as token_file:
+        token_file.write(pickle.dumps(credentials))
+    os.replace(temp_path, TOKEN_STORE_PATH)
+
+def seconds_until_token_expiry(credentials):
+    if credentials is None or credentials.expiry is None:
+        return None
+    # google-auth의 expiry는 시간대 없는 UTC 시간이야.
+    expiry = credentials.expiry.replace(tzinfo=datetime.timezone.utc)
+    return (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
 
-    # 인증 정보가 없거나 유효하지 않다면 새로 인증 절차 시작 (로컬에서만 가능)
-    if not credentials or not credentials.valid:
-        if credentials and credentials.expired and credentials.refresh_token:
-            print("인증 토큰 만료, 새로고침 중...")
+def refresh_credentials(credentials, margin=TOKEN_REFRESH_MARGIN_SECONDS):
+    # 만료가 margin초 안으로 다가왔을 때만 새로고침해. 락을 잡은 다음 다시 확인해서,
+    # 여러 곳에서 동시에 불러도 실제 새로고침은 한 번만 일어나.
+    with token_refresh_lock:
+        remaining = seconds_until_token_expiry(credentials)
+        if credentials.valid and remaining is not None and remaining > margin:
+            return False
+        log.info("인증 토큰 새로고침 중...")
+        from google.auth.transport.requests import Request
+        try:
             credentials.refresh(Request())
-            # 새로고침된 토큰을 Secrets에 다시 저장 (이 부분은 Replit에서 직접 업데이트 필요)
-            # 또는 로컬에서 다시 실행하여 token.pickle을 업데이트하고 Base64로 변환하여 Secrets 업데이트
-            print("토큰 새로고침됨. Secrets 업데이트가 필요할 수 있습니다.")
-        else:
-            print("새로운 인증 필요. 웹 브라우저가 열릴 겁니다. (로컬에서만 가능)")
-            # Replit Secrets에서 client_secret.json 내용 가져오기
-            client_secret_json_str = os.environ.get('CLIENT_SECRET_JSON')
-            if not client_secret_json_str:
-                print("오류: CLIENT_SECRET_JSON 환경 변수가 설정되지 않았습니다. Replit Secrets에 추가해주세요.")
-                raise FileNotFoundError("CLIENT_SECRET_JSON secret 없음")
+        except Exception:
+            TOKEN_REFRESHES.labels(result='error').inc()
+            raise
+        TOKEN_REFRESHES.labels(result='ok').inc()
+        try:
+            save_credentials(credentials)
+        except Exception as e:
+            log.error(f"새로고침된 토큰 저장 실패: {e}")
+        log.info(f"토큰 새로고침됨. (다음 만료까지 {seconds_until_token_expiry(credentials) or 0:.0f}초)")
+        return True
 
-            try:
-                # Secrets 내용을 임시 client_secret.json 파일로 저장
-                client_secret_data = json.loads(client_secret_json_str)
-                # 임시 파일로 저장하여 InstalledAppFlow가 읽을 수 있도록 함
-                with open('temp_client_secret.json', 'w') as f:
-                    json.dump(client_secret_data, f)
-
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'temp_client_secret.json', SCOPES)
-                print("구글 계정으로 로그인하여 봇에게 권한을 허용해주세요.")
-                
-                # Replit 환경에서는 웹 브라우저가 직접 열리지 않으므로, 이 부분은 로컬에서만 작동합니다.
-                # Replit에서는 이미 token.pickle이 Secrets에 있어야 합니다.
-                if os.environ.get('REPL_ID'): # Replit 환경인지 확인
-                     print("Replit 환경에서는 초기 인증이 불가능합니다. token.pickle을 Secrets에 직접 넣어주세요.")
-                     raise Exception("Replit에서 초기 인증 불가")
-                
-                credentials = flow.run_local_server(port=0)
-                
-                # 새로 생성된 token.pickle을 Base64로 인코딩하여 출력
-                with open('token.pickle', 'wb') as token_file:
-                    pickle.dump(credentials, token_file)
-                with open('token.pickle', 'rb') as token_file:
-                    encoded_token = base64.b64encode(token_file.read()).decode('utf-8')
-                print("\n\n--- 새로운 TOKEN_PICKLE_BASE64 값 ---")
-                print(encoded_token)
-                print("-------------------------------------\n\n")
-                print("이 값을 Replit Secrets의 TOKEN_PICKLE_BASE64에 업데이트 해주세요.")
-                
-                os.remove('temp_client_secret.json') # 사용 후 임시 파일 삭제
-                os.remove('token.pickle') # 사용 후 임시 파일 삭제
-
-            except FileNotFoundError as e:
-                print(f"인증 파일 오류: {e}. 프로그램 종료.")
-                exit(1)
-            except Exception as e:
-                print(f"인증 과정 중 오류 발생: {e}")
-                print("client_secret.json 내용이 올바른지 확인해주세요.")
-                raise # 오류 발생 시 프로그램 종료
+def run_installed_app_flow():
+    log.info("새로운 인증 필요. 웹 브라우저가 열릴 겁니다. (로컬에서만 가능)")
+    # Replit Secrets에서 client_secret.json 내용 가져오기
+    client_secret_json_str = os.environ.get('CLIENT_SECRET_JSON')
+    if not client_secret_json_str:
+        log.error("CLIENT_SECRET_JSON 환경 변수가 설정되지 않았습니다. Replit Secrets에 추가해주세요.")
+        raise FileNotFoundError("CLIENT_SECRET_JSON secret 없음")
+
+    try:
+        # Secrets 내용을 임시 파일 없이 바로 사용
+        client_secret_data = json.loads(client_secret_json_str)
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_config(client_secret_data, SCOPES)
+        log.info("구글 계정으로 로그인하여 봇에게 권한을 허용해주세요.")
 
-    youtube_service = build('youtube', 'v3', credentials=credentials)
+        # Replit 환경에서는 웹 브라우저가 직접 열리지 않으므로, 이 부분은 로컬에서만 작동합니다.
+        # Replit에서는 이미 token.pickle이 Secrets에 있어야 합니다.
+        if os.environ.get('REPL_ID'): # Replit 환경인지 확인
+            log.error("Replit 환경에서는 초기 인증이 불가능합니다. token.pickle을 Secrets에 직접 넣어주세요.")
+            raise Exception("Replit에서 초기 인증 불가")
+
+        credentials = flow.run_local_server(port=0)
+        save_credentials(credentials)
+
+        # 새로 생성된 token.pickle을 Base64로 인코딩하여 출력
+        encoded_token = base64.b64encode(pickle.dumps(credentials)).decode('utf-8')
+        print("\n\n--- 새로운 TOKEN_PICKLE_BASE64 값 ---")
+        print(encoded_token)
+        print("-------------------------------------\n\n")
+        print("이 값을 Replit Secrets의 TOKEN_PICKLE_BASE64에 업데이트 해주세요.")
+        return credentials
+
+    except FileNotFoundError as e:
+        log.error(f"인증 파일 오류: {e}. 프로그램 종료.")
+        exit(1)
+    except Exception as e:
+        log.error(f"인증 과정 중 오류 발생: {e}")
+        log.error("client_secret.json 내용이 올바른지 확인해주세요.")
+        raise # 오류 발생 시 프로그램 종료
+
+youtube_service_lock = threading.Lock() # 여러 스레드가 처음에 동시에 불러도 서비스 객체는 한 번만 만들게
+
+def get_youtube_credentials():
+    global youtube_credentials
+    if youtube_credentials is not None: # 이미 인증되어 있다면 기존 인증 정보 반환
+        return youtube_credentials
+
+    credentials = load_stored_credentials()
+
+    # 인증 정보가 없거나 유효하지 않다면 새로고침하거나 새로 인증 절차 시작 (새 인증은 로컬에서만 가능)
+    if credentials and credentials.refresh_token and not credentials.valid:
+        refresh_credentials(credentials, margin=0)
+    elif not credentials or not credentials.valid:
+        credentials = run_installed_app_flow()
+
+    youtube_credentials = credentials
+    return youtube_credentials
+
+def build_youtube_service(credentials):
+    # 디스커버리 문서는 라이브러리에 같이 들어 있는 로컬 사본(static_discovery)을 써서
+    # 시작할 때 네트워크에 다녀오지 않아.
+    from googleapiclient.discovery import build
+    return build('youtube', 'v3', credentials=credentials, static_discovery=True, cache_discovery=False)
+
+def get_authenticated_service_instance():
+    global youtube_service
+    credentials = get_youtube_credentials()
+    if youtube_service is None:
+        with youtube_service_lock:
+            if youtube_service is None:
+                youtube_service = build_youtube_service(credentials)
+    # 백그라운드 새로고침이 어떤 이유로 늦었더라도 만료된 토큰으로 요청하지 않게 마지막으로 확인해.
+    if not credentials.valid and credentials.refresh_token:
+        refresh_credentials(credentials, margin=0)
     return youtube_service
 
+async def refresh_token_periodically():
+    # 만료 5분 전에 미리 새로고침해 두는 백그라운드 작업
+    while True:
+        remaining = seconds_until_token_expiry(youtube_credentials)
+        if remaining is None:
+            await asyncio.sleep(TOKEN_REFRESH_RETRY_SECONDS * 10)
+            continue
+        await asyncio.sleep(max(0, remaining - TOKEN_REFRESH_MARGIN_SECONDS))
+        try:
+            await youtube_api.run(refresh_credentials, youtube_credentials)
+        except Exception as e:
+            log.error(f"인증 토큰 새로고침 실패: {e}. {TOKEN_REFRESH_RETRY_SECONDS}초 뒤에 다시 시도할게.")
+            await asyncio.sleep(TOKEN_REFRESH_RETRY_SECONDS)
+
+# --- 비동기 유튜브 API (디스코드 이벤트 루프를 멈추지 않게!) ---
+# googleapiclient의 .execute()는 동기 함수라서 코루틴 안에서 그냥 부르면
+# 응답이 올 때까지 하트비트, 다른 서버 명령어까지 전부 멈춰 버려.
+# 그래서 정해진 개수의 스레드 풀에서 실행하고, 결과만 await로 받아올 거야.
+YOUTUBE_API_MAX_WORKERS = int(os.environ.get('YOUTUBE_API_MAX_WORKERS', 8)) # 동시에 실행할 API 요청 수
+YOUTUBE_API_TIMEOUT_SECONDS = float(os.environ.get('YOUTUBE_API_TIMEOUT_SECONDS', 15)) # 요청 하나당 제한 시간
+FEED_HTTP_MAX_WORKERS = int(os.environ.get('FEED_HTTP_MAX_WORKERS', 16)) # RSS/WebSub 요청용 스레드 수 (API 요청과 따로)
+
+class AsyncYouTube:
+    def __init__(self, max_workers=YOUTUBE_API_MAX_WORKERS, timeout=YOUTUBE_API_TIMEOUT_SECONDS, name='youtube-api'):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # httplib2.Http는 스레드 간에 같이 쓰면 안전하지 않아서, 스레드마다 keep-alive 연결을 하나씩 둬.
+        self._local = threading.local()
+
+    def _thread_http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(youtube_credentials, http=httplib2.Http(timeout=self.timeout))
+            self._local.http = http
+        return http
+
+    def _execute_blocking(self, build_request):
+        service = get_authenticated_service_instance()
+        api_request = build_request(service)
+        # methodId는 'youtube.videos.list' 같은 모양이야.
+        method = getattr(api_request, 'methodId', None) or 'unknown'
+        method = method[len('youtube.'):] if method.startswith('youtube.') else method
+        YOUTUBE_QUOTA_UNITS.labels(method=method).inc(QUOTA_COSTS.get(method, 1))
+        started = time.perf_counter()
+        try:
+            return api_request.execute(http=self._thread_http())
+        except Exception:
+            YOUTUBE_API_ERRORS.labels(method=method).inc()
+            raise
+        finally:
+            YOUTUBE_API_LATENCY.labels(method=method).observe(time.perf_counter() - started)
+
+    async def run(self, func, *args, timeout=None):
+        # 아무 동기 함수나 스레드 풀에서 실행해. (토큰 새로고침 같은 것)
+        # 제한 시간은 스레드에서 실제로 시작한 때부터 재. (빈 스레드를 기다린 시간까지 넣으면
+        # 바쁠 때 멀쩡한 요청도 줄만 서다가 시간 초과가 나)
+        # 호출한 쪽이 취소되면 아직 시작 안 한 작업은 바로 빠지고,
+        # 이미 실행 중인 요청은 스레드에서 끝나더라도 결과를 버려.
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def mark_started():
+            if not started.done():
+                started.set_result(None)
+
+        def call():
+            loop.call_soon_threadsafe(mark_started)
+            return func(*args)
+
+        future = loop.run_in_executor(self._executor, call)
+        try:
+            await asyncio.wait((started, future), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    async def execute(self, build_request, timeout=None):
+        # build_request는 서비스 객체를 받아서 요청을 만드는 함수야.
+        # 예: await youtube_api.execute(lambda youtube: youtube.videos().list(part='snippet', id=video_id))
+        return await self.run(self._execute_blocking, build_request, timeout=timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+youtube_api = AsyncYouTube()
+# RSS 피드와 WebSub 구독 요청은 쿼터와 상관없는 일반 HTTP라서 스레드 풀을 따로 써.
+# 같이 쓰면 채널이 많을 때 라이브 확인 한 주기의 RSS 요청이 풀을 꽉 채워서 `!링크`가 그 뒤에 줄을 서.
+feed_http = AsyncYouTube(max_workers=FEED_HTTP_MAX_WORKERS, name='feed-http')
+
+# --- 영상 정보 캐시 (`!링크` 용) ---
+# 방송이 끝나자마자 여러 명이 같은 다시보기 링크를 올리면 매번 API를 부를 필요가 없어.
+# 끝난 방송(actualEndTime 있음)은 정보가 바뀌지 않으니까 오래 두고,
+# 예정/진행 중인 방송은 금방 바뀌니까 짧게 둘 거야. 없는 영상도 잠깐 기억해 둬.
+VIDEO_CACHE_MAX_SIZE = int(os.environ.get('VIDEO_CACHE_MAX_SIZE', 2048))
+VIDEO_CACHE_TTL_ENDED = 7 * 24 * 3600 # 끝난 방송: 7일
+VIDEO_CACHE_TTL_VOD = 24 * 3600 # 라이브가 아닌 일반 영상: 1일
+VIDEO_CACHE_TTL_LIVE = 60 # 예정/진행 중인 방송: 1분
+VIDEO_CACHE_TTL_MISSING = 5 * 60 # 없는 영상: 5분
+
+def video_cache_ttl(video_data):
+    if video_data is None:
+        return VIDEO_CACHE_TTL_MISSING
+    live_details = video_data.get('liveStreamingDetails')
+    if not live_details:
+        return VIDEO_CACHE_TTL_VOD
+    if 'actualEndTime' in live_details:
+        return VIDEO_CACHE_TTL_ENDED
+    return VIDEO_CACHE_TTL_LIVE
+
+class VideoInfoCache:
+    def __init__(self, max_size=VIDEO_CACHE_MAX_SIZE, ttl_for=video_cache_ttl, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_for = ttl_for
+        self.clock = clock
+        self._entries = OrderedDict() # 영상 ID -> (만료 시각, 영상 정보 또는 None)
+        self._in_flight = {} # 영상 ID -> 지금 API를 부르고 있는 작업
+        self._batch_tasks = set() # 묶음 조회 작업 (이벤트 루프는 약한 참조만 들고 있어서 여기서 붙잡아 둬)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0 # 다른 사람이 이미 부르고 있던 요청에 얹혀 간 횟수
+
+    def peek(self, video_id):
+        # 캐시에 살아 있으면 (True, 정보), 없거나 만료됐으면 (False, None)
+        entry = self._entries.get(video_id)
+        if entry is None:
+            return False, None
+        expires_at, video_data = entry
+        if expires_at <= self.clock():
+            del self._entries[video_id]
+            return False, None
+        self._entries.move_to_end(video_id) # 최근에 쓴 건 뒤로 (LRU)
+        return True, video_data
+
+    def put(self, video_id, video_data):
+        self._entries[video_id] = (self.clock() + self.ttl_for(video_data), video_data)
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False) # 제일 오래 안 쓴 것부터 버려
+            self.evictions += 1
+
+    async def get(self, video_id, loader):
+        # loader(video_id)는 영상 정보(dict)나, 영상이 없으면 None을 돌려주는 코루틴이야.
+        found, video_data = self.peek(video_id)
+        if found:
+            self.hits += 1
+            return video_data
+
+        task = self._in_flight.get(video_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(video_id, loader))
+            self._in_flight[video_id] = task
+        # 기다리던 한 명이 취소돼도 같은 영상을 기다리는 다른 사람 요청은 계속 가야 하니까 shield!
+        return await asyncio.shield(task)
+
+    async def get_many(self, video_ids, batch_loader, batch_size=50):
+        # 여러 영상을 한꺼번에 조회해. 캐시에 없는 것만 batch_size개씩 묶어서
+        # batch_loader(영상 ID 목록) -> {영상 ID: 영상 정보} 로 불러와.
+        results = {}
+        waiting = {}
+        to_load = []
+        for video_id in dict.fromkeys(video_ids): # 순서는 유지하면서 중복 제거
+            found, video_data = self.peek(video_id)
+            if found:
+                self.hits += 1
+                results[video_id] = video_data
+            elif video_id in self._in_flight:
+                self.coalesced += 1
+                waiting[video_id] = self._in_flight[video_id]
+            else:
+                self.misses += 1
+                to_load.append(video_id)
+
+        loop = asyncio.get_running_loop()
+        for start in range(0, len(to_load), batch_size):
+            batch = to_load[start:start + batch_size]
+            futures = {video_id: loop.create_future() for video_id in batch}
+            self._in_flight.update(futures)
+            waiting.update(futures)
+            task = asyncio.ensure_future(self._load_batch(futures, batch_loader))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+        if waiting:
+            loaded = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            results.update(zip(waiting, loaded))
+        return {video_id: results[video_id] for video_id in dict.fromkeys(video_ids)}
+
+    async def _load_batch(self, futures, batch_loader):
+        try:
+            loaded = await batch_loader(list(futures))
+        except asyncio.CancelledError:
+            for video_id, future in futures.items():
+                del self._in_flight[video_id]
+                future.cancel()
+            raise
+        except Exception as e:
+            # 오류가 나면 캐시하지 않고 기다리던 쪽에 그대로 던져
+            for video_id, future in futures.items():
+                del self._in_flight[video_id]
+                if not future.done():
+                    future.set_exception(e)
+                    # 기다리던 쪽이 전부 취소됐어도 "Future exception was never retrieved" 경고가 안 뜨게
+                    future.exception()
+            return
+        for video_id, future in futures.items():
+            video_data = loaded.get(video_id) # 응답에 없으면 없는 영상이야.
+            self.put(video_id, video_data)
+            del self._in_flight[video_id]
+            if not future.done():
+                future.set_result(video_data)
+
+    async def _load(self, video_id, loader):
+        try:
+            video_data = await loader(video_id)
+            self.put(video_id, video_data) # 오류가 나면 캐시하지 않고 그대로 던져
+            return video_data
+        finally:
+            del self._in_flight[video_id]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+video_info_cache = VideoInfoCache()
+
+VIDEO_CACHE_STATS = Gauge('video_cache', '`!링크` 영상 정보 캐시 상태', ['stat'])
+for stat_name in ('size', 'hits', 'misses', 'coalesced', 'evictions'):
+    VIDEO_CACHE_STATS.labels(stat=stat_name).set_function(lambda stat_name=stat_name: video_info_cache.stats()[stat_name])
+
+async def fetch_video_info(video_id):
+    # 스레드 풀에서 실행해서 응답을 기다리는 동안에도 봇은 다른 일을 할 수 있어.
+    video_response = await youtube_api.execute(lambda youtube: youtube.videos().list(
+        part='snippet,liveStreamingDetails',
+        id=video_id
+    ))
+    items = video_response.get('items')
+    return items[0] if items else None
+
+async def fetch_video_infos(video_ids):
+    # 최대 50개를 videos().list 한 번으로 불러와. (1 유닛)
+    video_response = await youtube_api.execute(lambda youtube: youtube.videos().list(
+        part='snippet,liveStreamingDetails',
+        id=','.join(video_ids)
+    ))
+    return {item['id']: item for item in video_response.get('items', [])}
+
 # --- 유튜브 링크에서 비디오 ID 추출 함수 ---
+# 정규식은 불러올 때 한 번만 컴파일해. 메시지 어디에 있든 아래 모양을 전부 찾아:
+#   youtube.com/watch?v=ID (v=가 맨 앞이 아니어도 돼), youtu.be/ID, youtube.com/shorts/ID, youtube.com/live/ID,
+#   youtube.com/embed/ID, youtube.com/v/ID, youtube-nocookie.com/embed/ID, m./music. 주소, http(s) 없이 쓴 주소
+# embed/v 주소는 ID 뒤에 ?, #, /, 공백(또는 >, ) 같은 끝 표시)이 와야 하고, 재생목록용 embed/videoseries는 빼.
+# 모양마다 ID 그룹이 따로 있어서 맞은 그룹(lastindex)에서 꺼내.
+YOUTUBE_URL_RE = re.compile(
+    r'(?<![\w-])(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtu\.be/([A-Za-z0-9_-]{11})'
+    r'|youtube(?:-nocookie)?\.com/(?:'
+    r'(?:embed|v|e)/(?!videoseries)([A-Za-z0-9_-]{11})(?=[?#&/\s>)]|$)'
+    r'|(?:shorts|live)/([A-Za-z0-9_-]{11})'
+    r'|[^\s?#]*\?(?:[^\s#]*?[?&])?v=([A-Za-z0-9_-]{11})))'
+    r'(?![A-Za-z0-9_-])'
+)
+
 def extract_video_id(url):
-    youtube_regex = (
-        r'(https?://)?(www\.)?'
-        '(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        '(watch\?v=|embed/|v/|.+\?v=|)([a-zA-Z0-9_-]{11})'
-    )
-    match = re.match(youtube_regex, url)
+    match = YOUTUBE_URL_RE.search(url)
     if match:
-        return match.group(6)
+        return match.group(match.lastindex)
     return None
 
+def extract_video_ids(text):
+    # 여러 줄에 섞여 있는 링크를 전부 찾아서, 처음 나온 순서대로 중복 없이 돌려줘.
+    return list(dict.fromkeys(match.group(match.lastindex) for match in YOUTUBE_URL_RE.finditer(text)))
+
+# --- `!링크` 여러 개 한꺼번에 계산하기 ---
+DISCORD_MESSAGE_LIMIT = 2000 # 디스코드 메시지 하나의 최대 글자 수
+LINK_ATTACHMENT_MAX_BYTES = 1024 * 1024 # 첨부 텍스트 파일은 1MB까지만 읽어
+# `!링크` 하나로 볼 영상 수 (50개당 1 유닛). 1MB 파일이면 링크가 3만 개도 넘어서
+# 한 명이 하루 쿼터를 다 쓰고 라이브 확인까지 막을 수 있으니까 앞에서부터 여기까지만 봐.
+LINK_COMMAND_MAX_VIDEOS = int(os.environ.get('LINK_COMMAND_MAX_VIDEOS', 500))
+KST = pytz.timezone('Asia/Seoul')
+
+def parse_youtube_time(iso_time):
+    return datetime.datetime.fromisoformat(iso_time.replace('Z', '+00:00'))
+
+def format_duration(total_seconds):
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours}시간 {minutes}분 {seconds}초"
+
+async def read_text_attachments(message):
+    # 메시지에 붙은 .txt 파일 내용을 전부 읽어와.
+    texts = []
+    for attachment in message.attachments:
+        is_text = (attachment.content_type or '').startswith('text/') or attachment.filename.endswith('.txt')
+        if is_text and attachment.size <= LINK_ATTACHMENT_MAX_BYTES:
+            data = await attachment.read()
+            texts.append(data.decode('utf-8', errors='ignore'))
+    return '\n'.join(texts)
+
+def split_into_messages(lines, header='', footer=''):
+    # 코드 블록 표를 디스코드 길이 제한(2000자)에 맞춰서 필요할 때만 여러 메시지로 나눠.
+    messages = []
+    body_limit = DISCORD_MESSAGE_LIMIT - len(header) - len(footer) - len('```\n```\n')
+    current = []
+    current_length = 0
+    for line in lines:
+        if current and current_length + len(line) + 1 > body_limit:
+            messages.append(current)
+            current = []
+            current_length = 0
+        current.append(line)
+        current_length += len(line) + 1
+    messages.append(current)
+
+    result = []
+    for i, chunk in enumerate(messages):
+        text = '```\n' + '\n'.join(chunk) + '\n```'
+        if i == 0:
+            text = header + text
+        if i == len(messages) - 1:
+            text = text + footer
+        result.append(text)
+    return result
+
+def build_bulk_link_report(video_ids, videos):
+    # 영상마다 KST 날짜/시작/종료/방송 시간을 한 줄씩 쓰고, 끝난 방송의 총합을 계산해.
+    lines = [f"{'#':>3} {'날짜':<5} {'시작':<5} {'종료':<5} {'방송 시간':>11}  제목"]
+    total_seconds = 0
+    counted = 0
+    for number, video_id in enumerate(video_ids, start=1):
+        video_data = videos.get(video_id)
+        if video_data is None:
+            lines.append(f"{number:>3} {'-':<5} {'-':<5} {'-':<5} {'-':>11}  (찾을 수 없음: {video_id})")
+            continue
+        title = video_data.get('snippet', {}).get('title', '제목 없음')
+        if len(title) > 24:
+            title = title[:23] + '…'
+        live_details = video_data.get('liveStreamingDetails', {})
+        if 'actualStartTime' in live_details and 'actualEndTime' in live_details:
+            start_dt = parse_youtube_time(live_details['actualStartTime'])
+            end_dt = parse_youtube_time(live_details['actualEndTime'])
+            seconds = int((end_dt - start_dt).total_seconds())
+            total_seconds += seconds
+            counted += 1
+            start_kst = start_dt.astimezone(KST)
+            end_kst = end_dt.astimezone(KST)
+            duration = f"{seconds // 3600}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+            lines.append(
+                f"{number:>3} {start_kst.strftime('%m/%d'):<5} {start_kst.strftime('%H:%M'):<5} "
+                f"{end_kst.strftime('%H:%M'):<5} {duration:>11}  {title}"
+            )
+        else:
+            if 'actualStartTime' in live_details:
+                status = '진행 중'
+            elif 'scheduledStartTime' in live_details:
+                status = '예정'
+            else:
+                status = '일반 영상'
+            lines.append(f"{number:>3} {'-':<5} {'-':<5} {'-':<5} {status:>11}  {title}")
+
+    header = f"**링크 {len(video_ids)}개 분석 결과** (KST)\n"
+    footer = f"\n**총 방송 시간 ({counted}개 방송):** {format_duration(total_seconds)}"
+    return split_into_messages(lines, header, footer)
+
 # --- 전역 변수 (봇이 라이브 상태를 기억하게 할 거야!) ---
-is_live = False # 현재 방송 중인지 아닌지
-live_start_time = None # 방송 시작 시간
-live_end_time = None # 방송 종료 시간
-target_channel_id = 0 # 디스코드 메시지를 보낼 채널 ID (이 채널로 라이브 알림을 보낼 거야!)
 CHECK_INTERVAL_SECONDS = 60 # 몇 초마다 유튜브 방송 상태를 확인할지 (1분)
 
+# 디스코드 서버별 알림 채널 (서버 ID -> 채널 ID, `!채널설정`으로 정해)
+alert_channels = {}
+
+# 유튜브 채널별 라이브 상태 (채널 ID -> {'video_id': ..., 'start_time': ..., 'last_seen': ...})
+# 여기에 들어 있으면 지금 방송 중이라는 뜻이야.
+live_sessions = {}
+
+# 유튜브 채널별로 마지막으로 후보 영상을 확인한 시각 (채널 ID -> UTC datetime)
+# 확인 사이에 시작했다가 끝나 버린 방송을 찾을 때 써.
+live_checked_at = {}
+
+# --- 상태 저장소 (재시작해도 알림 채널과 방송 상태를 잊지 않게!) ---
+# SQLite WAL 모드로 파일 하나에 저장해. 쓰기는 바로 하지 않고 모아 뒀다가
+# 백그라운드에서 한 번에 저장해서 라이브 확인이나 명령어 처리를 느리게 하지 않아.
+STATE_DB_PATH = os.environ.get('STATE_DB_PATH', 'bot_state.db')
+STATE_FLUSH_INTERVAL_SECONDS = 5 # 모아 둔 쓰기를 몇 초마다 저장할지
+SENT_NOTIFICATION_KEEP_DAYS = 7 # 보낸 알림 기록(중복 전송 방지용)을 며칠 동안 남길지
+
+class StateStore:
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS alert_channels (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS live_sessions (
+                youtube_channel_id TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                actual_start_time TEXT NOT NULL,
+                last_seen_time TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sent_notifications (
+                discord_channel_id INTEGER NOT NULL,
+                video_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                sent_time TEXT NOT NULL,
+                PRIMARY KEY (discord_channel_id, video_id, event)
+            );
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                video_id TEXT PRIMARY KEY,
+                youtube_channel_id TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                duration_seconds INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS broadcasts_by_channel_start ON broadcasts (youtube_channel_id, start_ts);
+            CREATE TABLE IF NOT EXISTS broadcast_backfill (
+                youtube_channel_id TEXT PRIMARY KEY,
+                page_token TEXT,
+                completed_ts INTEGER
+            );
+        ''')
+        self._lock = threading.Lock()
+        # 아직 저장 안 한 쓰기 (같은 키는 마지막 값만 남아)
+        self._pending = {}
+
+    def load(self):
+        # 시작할 때 한 번에 전부 읽어 와서 (알림 채널, 라이브 상태)를 돌려줘.
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT 'alert', CAST(guild_id AS TEXT), channel_id, NULL, NULL FROM alert_channels
+                UNION ALL
+                SELECT 'live', youtube_channel_id, video_id, actual_start_time, last_seen_time FROM live_sessions
+            ''').fetchall()
+        channels = {}
+        sessions = {}
+        for kind, key, value, start_time, last_seen in rows:
+            if kind == 'alert':
+                channels[int(key)] = value
+            else:
+                sessions[key] = {
+                    'video_id': value,
+                    'start_time': datetime.datetime.fromisoformat(start_time),
+                    'last_seen': datetime.datetime.fromisoformat(last_seen),
+                }
+        return channels, sessions
+
+    def load_live_sessions(self, youtube_channel_ids):
+        # 다른 프로세스에서 넘겨받은 채널의 방송 상태만 읽어 와.
+        youtube_channel_ids = list(youtube_channel_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT youtube_channel_id, video_id, actual_start_time, last_seen_time FROM live_sessions '
+                f"WHERE youtube_channel_id IN ({','.join('?' * len(youtube_channel_ids))})",
+                youtube_channel_ids
+            ).fetchall()
+        return {
+            channel_id: {
+                'video_id': video_id,
+                'start_time': datetime.datetime.fromisoformat(start_time),
+                'last_seen': datetime.datetime.fromisoformat(last_seen),
+            }
+            for channel_id, video_id, start_time, last_seen in rows
+        }
+
+    def set_alert_channel(self, guild_id, channel_id):
+        self._pending[('alert', guild_id)] = (
+            'INSERT OR REPLACE INTO alert_channels (guild_id, channel_id) VALUES (?, ?)',
+            (guild_id, channel_id)
+        )
+
+    def save_live_session(self, youtube_channel_id, session):
+        self._pending[('live', youtube_channel_id)] = (
+            'INSERT OR REPLACE INTO live_sessions (youtube_channel_id, video_id, actual_start_time, last_seen_time) '
+            'VALUES (?, ?, ?, ?)',
+            (youtube_channel_id, session['video_id'], session['start_time'].isoformat(), session['last_seen'].isoformat())
+        )
+
+    def delete_live_session(self, youtube_channel_id):
+        self._pending[('live', youtube_channel_id)] = (
+            'DELETE FROM live_sessions WHERE youtube_channel_id = ?',
+            (youtube_channel_id,)
+        )
+
+    def record_sent_notification(self, discord_channel_id, video_id, event):
+        self._pending[('sent', discord_channel_id, video_id, event)] = (
+            'INSERT OR REPLACE INTO sent_notifications (discord_channel_id, video_id, event, sent_time) VALUES (?, ?, ?, ?)',
+            (discord_channel_id, video_id, event, datetime.datetime.now(datetime.timezone.utc).isoformat())
+        )
+
+    def load_sent_notifications(self, keep_days=SENT_NOTIFICATION_KEEP_DAYS):
+        # 오래된 기록은 지우고, 남은 (채널, 영상, 이벤트) 목록을 돌려줘.
+        cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=keep_days)).isoformat()
+        with self._lock:
+            self._conn.execute('DELETE FROM sent_notifications WHERE sent_time < ?', (cutoff,))
+            rows = self._conn.execute('SELECT discord_channel_id, video_id, event FROM sent_notifications').fetchall()
+        return set(rows)
+
+    def save_broadcast(self, youtube_channel_id, video_id, start_ts, duration_seconds):
+        self._pending[('broadcast', video_id)] = (
+            'INSERT OR REPLACE INTO broadcasts (video_id, youtube_channel_id, start_ts, duration_seconds) VALUES (?, ?, ?, ?)',
+            (video_id, youtube_channel_id, start_ts, duration_seconds)
+        )
+
+    def save_backfill_state(self, youtube_channel_id, page_token, completed_ts):
+        self._pending[('backfill', youtube_channel_id)] = (
+            'INSERT OR REPLACE INTO broadcast_backfill (youtube_channel_id, page_token, completed_ts) VALUES (?, ?, ?)',
+            (youtube_channel_id, page_token, completed_ts)
+        )
+
+    def load_broadcasts(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT youtube_channel_id, video_id, start_ts, duration_seconds FROM broadcasts'
+            ).fetchall()
+
+    def load_backfill_state(self):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT youtube_channel_id, page_token, completed_ts FROM broadcast_backfill'
+            ).fetchall()
+        return {channel_id: (page_token, completed_ts) for channel_id, page_token, completed_ts in rows}
+
+    def _write(self, writes):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                for sql, params in writes:
+                    self._conn.execute(sql, params)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    async def flush(self):
+        if not self._pending:
+            return
+        # 이벤트 루프에서 대기열을 통째로 바꿔치기한 다음, 실제 저장은 스레드에서 해.
+        writes, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, list(writes.values()))
+        except Exception:
+            # 실패한 쓰기는 다음에 다시 시도 (그 사이에 들어온 새 값이 있으면 그게 우선)
+            writes.update(self._pending)
+            self._pending = writes
+            raise
+
+    def close(self):
+        if self._pending:
+            self._write(list(self._pending.values()))
+            self._pending = {}
+        with self._lock:
+            self._conn.close()
+
+state_store = None # 봇 실행 시작점에서 StateStore로 만들어
+
+async def flush_state_periodically():
+    while True:
+        await asyncio.sleep(STATE_FLUSH_INTERVAL_SECONDS)
+        try:
+            await state_store.flush()
+        except Exception as e:
+            log.error(f"상태 저장 중 오류 발생: {e}")
+
+# --- 유튜브 API 쿼터 계산 ---
+# search().list는 한 번에 100 유닛이라 채널 하나만 1분마다 봐도 하루 14만 유닛이 넘어.
+# 그래서 업로드 목록(RSS/재생목록)으로 후보 영상을 찾고, videos().list로 50개씩 묶어서 확인할 거야.
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'playlistItems.list': 1,
+}
+VIDEOS_LIST_BATCH_SIZE = 50 # videos().list 한 번에 넣을 수 있는 최대 ID 개수
+# 채널마다 최근 업로드 몇 개를 라이브 후보로 볼지. RSS에 들어 있는 15개를 전부 봐.
+# 며칠 뒤로 예약해 둔 대기실은 그 사이에 쇼츠가 몇 개만 올라와도 뒤로 밀리는데,
+# 후보에서 빠지면 방송이 시작돼도 못 찾아. ID는 50개씩 묶어서 1 유닛이라 늘려도 쿼터는 거의 그대로야.
+CANDIDATES_PER_CHANNEL = 15
+RSS_FEED_URL = 'https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}'
+RSS_TIMEOUT_SECONDS = 10
+
+class QuotaTally:
+    # 작업 하나(라이브 확인 한 주기, 백필 한 페이지)가 쓴 쿼터를 세.
+    # 라이브 확인과 백필이 동시에 돌아도 서로 섞이지 않게 작업마다 따로 만들어서 넘겨.
+    def __init__(self):
+        self.units = 0
+
+    def spend(self, method, calls=1):
+        self.units += QUOTA_COSTS.get(method, 0) * calls
+
+def get_watched_channel_ids():
+    # YOUTUBE_CHANNEL_IDS에 쉼표로 여러 채널을 넣을 수 있어. (예: UCaaa,UCbbb)
+    # 예전처럼 YOUTUBE_CHANNEL_ID 하나만 설정해도 그대로 동작해.
+    raw = os.environ.get('YOUTUBE_CHANNEL_IDS') or os.environ.get('YOUTUBE_CHANNEL_ID') or ''
+    channel_ids = []
+    for channel_id in re.split(r'[\s,]+', raw):
+        if channel_id and channel_id not in channel_ids:
+            channel_ids.append(channel_id)
+    return channel_ids
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# --- 후보 영상 찾기 (쿼터 0 또는 1 유닛) ---
+def fetch_recent_video_ids_from_rss(channel_id):
+    # 채널 RSS 피드는 쿼터를 전혀 안 써! 최근 업로드 15개 정도가 들어 있어.
+    url = RSS_FEED_URL.format(channel_id=channel_id)
+    with urllib.request.urlopen(url, timeout=RSS_TIMEOUT_SECONDS) as response:
+        feed = ElementTree.fromstring(response.read())
+    ns = {'atom': 'http://www.w3.org/2005/Atom', 'yt': 'http://www.youtube.com/xml/schemas/2015'}
+    video_ids = []
+    for entry in feed.findall('atom:entry', ns):
+        video_id = entry.findtext('yt:videoId', namespaces=ns)
+        if video_id:
+            video_ids.append(video_id)
+    return video_ids[:CANDIDATES_PER_CHANNEL]
+
+async def fetch_recent_video_ids_from_playlist(youtube, channel_id, quota):
+    # RSS가 실패하면 업로드 재생목록을 봐. (UC... -> UU..., 1 유닛)
+    uploads_playlist_id = 'UU' + channel_id[2:]
+    response = await youtube.execute(lambda service: service.playlistItems().list(
+        playlistId=uploads_playlist_id,
+        part='contentDetails',
+        maxResults=CANDIDATES_PER_CHANNEL
+    ))
+    quota.spend('playlistItems.list')
+    return [item['contentDetails']['videoId'] for item in response.get('items', [])]
+
+async def fetch_candidate_video_ids(youtube, channel_id, quota):
+    try:
+        return await feed_http.run(fetch_recent_video_ids_from_rss, channel_id)
+    except Exception as e:
+        log.warning(f"RSS 피드 불러오기 실패 ({channel_id}): {e!r}. 업로드 재생목록으로 대신 확인할게.")
+    return await fetch_recent_video_ids_from_playlist(youtube, channel_id, quota)
+
+# --- 라이브 상태 일괄 확인 (50개당 1 유닛) ---
+async def fetch_live_details(youtube, video_ids, quota, owners=None):
+    # owners(영상 ID -> 채널 ID)를 주면 실제로 그 채널 영상인지 snippet.channelId로 확인하고, 아니면 빼.
+    # (WebSub 푸시 내용은 믿을 수 없으니까 남의 방송을 우리 채널 방송으로 알리면 안 돼)
+    # part에 snippet을 더해도 쿼터는 똑같이 1 유닛이야.
+    async def fetch_batch(batch):
+        response = await youtube.execute(lambda service: service.videos().list(
+            part='snippet,liveStreamingDetails',
+            id=','.join(batch)
+        ))
+        quota.spend('videos.list')
+        return response.get('items', [])
+
+    # 묶음들은 스레드 풀 크기만큼 동시에 요청돼.
+    results = await asyncio.gather(*(fetch_batch(batch) for batch in chunked(video_ids, VIDEOS_LIST_BATCH_SIZE)))
+    details = {}
+    for items in results:
+        for item in items:
+            if owners is not None and item.get('snippet', {}).get('channelId') != owners.get(item['id']):
+                log.warning(f"다른 채널 영상이라서 건너뜀: {item['id']} ({owners.get(item['id'])})",
+                            extra={'video_id': item['id'], 'youtube_channel_id': owners.get(item['id'])})
+                continue
+            details[item['id']] = item.get('liveStreamingDetails', {})
+    return details
+
+def is_live_now(live_details):
+    return 'actualStartTime' in live_details and 'actualEndTime' not in live_details
+
+# --- 방송 기록 통계 (`!통계`) ---
+# 채널 업로드 재생목록을 한 페이지(50개)씩 넘기면서 끝난 라이브 방송의 시작 시간과 길이를 DB에 모아 둬.
+# 다 모은 뒤에는 라이브 확인 루프가 찾은 방송만 추가하면 돼.
+# 일/주/월별 합계는 메모리에 미리 더해 두니까 `!통계`는 유튜브 API를 한 번도 안 불러.
+STATS_BACKFILL_PAGE_SIZE = 50 # playlistItems().list 한 페이지 최대 크기
+STATS_BACKFILL_PAGE_DELAY_SECONDS = 1 # 페이지 사이에 쉬는 시간
+# 백필은 한 페이지에 2 유닛(playlistItems + videos)이라 쉬지 않으면 하루 쿼터를 금방 다 써.
+# 그래서 라이브 확인 예산과 따로 하루 예산을 두고, 바닥나면 채워질 때까지 멈춰.
+# (기본값: 라이브 확인 8000 + 백필 1000, 남은 1000은 `!링크` 몫)
+STATS_BACKFILL_QUOTA_BUDGET_PER_DAY = int(os.environ.get('STATS_BACKFILL_QUOTA_BUDGET_PER_DAY', 1000))
+STATS_BACKFILL_RETRY_SECONDS = 10 * 60 # 불러오기 실패 시 다시 시도할 때까지 기다릴 시간
+STATS_CATCHUP_MARGIN_SECONDS = 7 * 24 * 3600 # 재시작 후 마지막 확인 시점보다 7일 전 업로드까지 다시 훑어 봐
+STATS_PERIODS = {'일': 'day', '주': 'week', '월': 'month'}
+STATS_PERIOD_LIMITS = {'day': 14, 'week': 8, 'month': 12} # 통계에 보여 줄 최근 기간 수
+STATS_PERIOD_NAMES = {'day': '일별', 'week': '주별, 월요일 시작', 'month': '월별'}
+
+def stats_period_key(start_ts, period):
+    # 방송은 시작한 날(KST) 기준으로 묶어. 주는 월요일부터 시작해.
+    start_kst = datetime.datetime.fromtimestamp(start_ts, KST)
+    if period == 'day':
+        return start_kst.strftime('%Y-%m-%d')
+    if period == 'week':
+        return (start_kst.date() - datetime.timedelta(days=start_kst.weekday())).isoformat()
+    return start_kst.strftime('%Y-%m')
+
+class BroadcastStats:
+    def __init__(self):
+        self._broadcasts = {} # 영상 ID -> (채널 ID, 시작 시각(유닉스 초), 방송 길이(초))
+        self._rollups = {} # (채널 ID, 기간 종류) -> {기간 키: [방송 수, 총 방송 시간]}
+        self._totals = {} # 채널 ID -> [방송 수, 총 방송 시간]
+        self._latest_start = {} # 채널 ID -> 가장 최근 방송 시작 시각
+
+    def __len__(self):
+        return len(self._broadcasts)
+
+    def _apply(self, channel_id, start_ts, duration_seconds, sign):
+        for period in STATS_PERIOD_LIMITS:
+            bucket = self._rollups.setdefault((channel_id, period), {}).setdefault(stats_period_key(start_ts, period), [0, 0])
+            bucket[0] += sign
+            bucket[1] += sign * duration_seconds
+        total = self._totals.setdefault(channel_id, [0, 0])
+        total[0] += sign
+        total[1] += sign * duration_seconds
+
+    def add(self, channel_id, video_id, start_ts, duration_seconds):
+        # 같은 영상이 다시 들어오면 (백필과 라이브 확인이 둘 다 찾은 경우) 예전 값을 빼고 새 값으로 바꿔.
+        # 바뀐 게 있으면 True를 돌려줘.
+        new = (channel_id, start_ts, duration_seconds)
+        old = self._broadcasts.get(video_id)
+        if old == new:
+            return False
+        if old is not None:
+            self._apply(*old, -1)
+        self._broadcasts[video_id] = new
+        self._apply(*new, 1)
+        if start_ts > self._latest_start.get(channel_id, 0):
+            self._latest_start[channel_id] = start_ts
+        return True
+
+    def summary(self, channel_ids, period):
+        # 최근 기간부터 (기간 키, 방송 수, 총 방송 시간) 목록과 전체 (방송 수, 총 방송 시간)을 돌려줘.
+        merged = {}
+        for channel_id in channel_ids:
+            for key, (count, seconds) in self._rollups.get((channel_id, period), {}).items():
+                if count:
+                    bucket = merged.setdefault(key, [0, 0])
+                    bucket[0] += count
+                    bucket[1] += seconds
+        rows = [(key, count, seconds) for key, (count, seconds) in sorted(merged.items(), reverse=True)]
+        total_count = sum(self._totals.get(channel_id, [0, 0])[0] for channel_id in channel_ids)
+        total_seconds = sum(self._totals.get(channel_id, [0, 0])[1] for channel_id in channel_ids)
+        return rows[:STATS_PERIOD_LIMITS[period]], (total_count, total_seconds)
+
+broadcast_stats = BroadcastStats()
+broadcast_backfill = {} # 채널 ID -> (다음 페이지 토큰, 마지막으로 끝까지 훑은 시각)
+
+def record_finished_broadcast(youtube_channel_id, video_id, live_start_time, live_end_time):
+    start_ts = int(live_start_time.timestamp())
+    duration_seconds = max(0, int((live_end_time - live_start_time).total_seconds()))
+    if broadcast_stats.add(youtube_channel_id, video_id, start_ts, duration_seconds) and state_store:
+        state_store.save_broadcast(youtube_channel_id, video_id, start_ts, duration_seconds)
+
+def load_broadcast_history(store):
+    global broadcast_backfill
+    for channel_id, video_id, start_ts, duration_seconds in store.load_broadcasts():
+        broadcast_stats.add(channel_id, video_id, start_ts, duration_seconds)
+    broadcast_backfill = store.load_backfill_state()
+
+async def fetch_uploads_page(youtube, channel_id, quota, page_token=None):
+    response = await youtube.execute(lambda service: service.playlistItems().list(
+        playlistId='UU' + channel_id[2:],
+        part='contentDetails',
+        maxResults=STATS_BACKFILL_PAGE_SIZE,
+        pageToken=page_token
+    ))
+    quota.spend('playlistItems.list')
+    return response
+
+async def backfill_broadcast_history(youtube, channel_id, budget=None):
+    # 처음이면 업로드 목록 끝까지, 이미 다 훑은 채널이면 마지막으로 훑은 시점 근처까지만 봐.
+    # 처음 훑는 중에는 페이지마다 위치를 저장해서, 재시작해도 이어서 해.
+    # budget(QuotaBudget)을 주면 페이지마다 쿼터를 거기에 달고, 바닥나면 채워질 때까지 기다려.
+    page_token, completed_ts = broadcast_backfill.get(channel_id, (None, None))
+    catching_up = completed_ts is not None and page_token is None
+    cutoff = (completed_ts or 0) - STATS_CATCHUP_MARGIN_SECONDS
+    pass_started_ts = int(time.time())
+    pages = 0
+    found = 0
+    while True:
+        wait_seconds = budget.wait_time() if budget else 0
+        if wait_seconds > 0:
+            log.info(f"방송 기록 불러오기 쿼터 예산 초과. {wait_seconds:.0f}초 쉬었다가 이어서 할게.",
+                     extra={'youtube_channel_id': channel_id})
+            await asyncio.sleep(wait_seconds)
+        quota = QuotaTally()
+        try:
+            response = await fetch_uploads_page(youtube, channel_id, quota, page_token)
+            items = response.get('items', [])
+            video_ids = [item['contentDetails']['videoId'] for item in items]
+            details = await fetch_live_details(youtube, video_ids, quota) if video_ids else {}
+        finally:
+            if budget:
+                budget.spend(quota.units)
+        for video_id in video_ids:
+            live_details = details.get(video_id, {})
+            if 'actualStartTime' in live_details and 'actualEndTime' in live_details:
+                record_finished_broadcast(channel_id, video_id, parse_youtube_time(live_details['actualStartTime']),
+                                          parse_youtube_time(live_details['actualEndTime']))
+                found += 1
+        pages += 1
+        page_token = response.get('nextPageToken')
+        reached_known = catching_up and any(
+            parse_youtube_time(item['contentDetails']['videoPublishedAt']).timestamp() < cutoff
+            for item in items if 'videoPublishedAt' in item['contentDetails']
+        )
+        if not page_token or reached_known:
+            break
+        if not catching_up:
+            broadcast_backfill[channel_id] = (page_token, completed_ts)
+            if state_store:
+                state_store.save_backfill_state(channel_id, page_token, completed_ts)
+        await asyncio.sleep(STATS_BACKFILL_PAGE_DELAY_SECONDS)
+    broadcast_backfill[channel_id] = (None, pass_started_ts)
+    if state_store:
+        state_store.save_backfill_state(channel_id, None, pass_started_ts)
+    log.info(f"방송 기록 불러오기 완료 ({channel_id}): 페이지 {pages}개, 끝난 방송 {found}개",
+             extra={'youtube_channel_id': channel_id, 'pages': pages, 'broadcasts': found, 'catch_up': catching_up})
+
+async def backfill_watched_channels():
+    # 내가 확인하는 채널을 하나씩 훑어. 실패한 채널은 잠시 뒤에 다시 해.
+    # 여러 프로세스로 나눠 돌 때는 나중에 넘겨받는 채널도 있으니까 계속 돌면서 새 채널을 훑어.
+    done = set()
+    budget = QuotaBudget(STATS_BACKFILL_QUOTA_BUDGET_PER_DAY)
+    while True:
+        failed = False
+        for channel_id in owned_channel_ids():
+            if channel_id in done:
+                continue
+            try:
+                await backfill_broadcast_history(youtube_api, channel_id, budget)
+                done.add(channel_id)
+            except Exception as e:
+                log.warning(f"방송 기록 불러오기 실패 ({channel_id}): {e!r}. 나중에 다시 시도할게.")
+                failed = True
+        if not failed and coordinator is None:
+            return
+        await asyncio.sleep(STATS_BACKFILL_RETRY_SECONDS)
+
+def build_stats_report(channel_ids, period):
+    # 기간마다 방송 수/총 방송 시간/평균을 한 줄씩 쓰고, 맨 아래에 전체 합계를 붙여.
+    rows, (total_count, total_seconds) = broadcast_stats.summary(channel_ids, period)
+    target = channel_ids[0] if len(channel_ids) == 1 else f"채널 {len(channel_ids)}개"
+    header = f"**방송 통계 ({STATS_PERIOD_NAMES[period]}, KST)** - {target}\n"
+    if not total_count:
+        return [header + "아직 모아 둔 방송 기록이 없어. 잠시 후에 다시 물어봐 줘!"]
+    clock = lambda seconds: f"{seconds // 3600}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+    lines = [f"{'기간':<10} {'방송':>4} {'총 방송 시간':>11} {'평균':>9}"]
+    for key, count, seconds in rows:
+        lines.append(f"{key:<10} {count:>4} {clock(seconds):>11} {clock(seconds // count):>9}")
+    footer = (f"\n**전체 {total_count}개 방송:** 총 {format_duration(total_seconds)}, "
+              f"평균 {format_duration(total_seconds // total_count)}")
+    backfilling = sum(1 for channel_id in channel_ids if broadcast_backfill.get(channel_id, (None, None))[1] is None)
+    if backfilling:
+        footer += f"\n(과거 방송 기록을 아직 불러오는 중인 채널이 {backfilling}개 있어.)"
+    return split_into_messages(lines, header, footer)
+
+# --- 디스코드 알림 보내기 ---
+# 라이브 확인 루프는 알림을 대기열에 넣기만 하고 바로 다음 확인으로 넘어가.
+# 실제 전송은 NotificationDispatcher가 여러 서버 채널에 동시에(개수 제한 있음) 보내.
+# - 같은 (디스코드 채널, 영상, 이벤트)는 한 번만 보내. (재시도나 재시작해도 두 번 안 올라가게 DB에 기록)
+# - 시작 알림을 아직 못 보낸 채널에 종료 소식이 먼저 도착하면 두 개를 한 메시지로 합쳐서 보내.
+# - 디스코드 레이트 리밋(429)이나 일시적인 오류는 기다렸다가 다시 보내. (discord.py도 라우트별 버킷을 지켜 줘)
+NOTIFY_CONCURRENCY = int(os.environ.get('NOTIFY_CONCURRENCY', 20)) # 동시에 보낼 채널 수
+NOTIFY_MAX_ATTEMPTS = 5 # 한 채널에 최대 몇 번까지 보내 볼지
+NOTIFY_RETRY_BASE_SECONDS = 1 # 재시도 대기 시간 (1초, 2초, 4초 ... 에 약간의 무작위)
+NOTIFY_RETRY_MAX_SECONDS = 60
+NOTIFY_DRAIN_TIMEOUT_SECONDS = 10 # 종료할 때 남은 알림을 최대 몇 초까지 기다릴지
+
+NOTIFY_DELIVERY_LATENCY = Histogram(
+    'notification_delivery_seconds', '라이브 감지부터 디스코드 채널에 알림이 올라가기까지 걸린 시간',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+NOTIFY_QUEUE_SIZE = Gauge('notification_queue_size', '보내야 할 (채널, 영상) 알림 수')
+NOTIFY_COALESCED = Counter('notifications_coalesced_total', '시작/종료를 한 메시지로 합쳐 보낸 횟수')
+
+def format_kst(dt):
+    return dt.astimezone(KST).strftime('%Y년 %m월 %d일 %H시 %M분 %S초')
+
+def format_live_start_message(video_id, live_start_time):
+    return (
+        f"🚨 **라이브 방송 시작!** 🚨\n"
+        f"시작 시간: {format_kst(live_start_time)}\n"
+        f"지금 바로 보러 가자! ➡️ https://www.youtube.com/watch?v={video_id}"
+    )
+
+def format_live_end_message(live_start_time, live_end_time):
+    # 총 방송 시간 계산!
+    total_seconds = int((live_end_time - live_start_time).total_seconds())
+    return (
+        f" **라이브 방송 종료!** \n"
+        f"시작 시간: {format_kst(live_start_time)}\n"
+        f"종료 시간: {format_kst(live_end_time)}\n"
+        f"**총 방송 시간: {format_duration(total_seconds)}**"
+    )
+
+def format_live_start_end_message(video_id, live_start_time, live_end_time):
+    total_seconds = int((live_end_time - live_start_time).total_seconds())
+    return (
+        f"📺 **라이브 방송이 시작됐다가 벌써 끝났어!**\n"
+        f"시작 시간: {format_kst(live_start_time)}\n"
+        f"종료 시간: {format_kst(live_end_time)}\n"
+        f"**총 방송 시간: {format_duration(total_seconds)}**\n"
+        f"다시 보기 ➡️ https://www.youtube.com/watch?v={video_id}"
+    )
+
+def retry_delay_for(error, attempt):
+    # 디스코드가 기다리라고 알려 주면 그만큼, 아니면 지수 백오프 + 무작위
+    retry_after = getattr(error, 'retry_after', None)
+    response = getattr(error, 'response', None)
+    if retry_after is None and response is not None and getattr(error, 'status', None) == 429:
+        retry_after = float(response.headers.get('Retry-After', 0) or 0)
+    if retry_after:
+        return float(retry_after)
+    delay = min(NOTIFY_RETRY_MAX_SECONDS, NOTIFY_RETRY_BASE_SECONDS * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+def is_permanent_send_error(error):
+    # 권한이 없거나 채널이 없어진 건 다시 보내도 소용없어.
+    return isinstance(error, (discord.Forbidden, discord.NotFound))
+
+class NotificationDispatcher:
+    def __init__(self, concurrency=NOTIFY_CONCURRENCY, clock=time.monotonic):
+        self.concurrency = concurrency
+        self.clock = clock
+        self._queue = asyncio.Queue()
+        self._queued = set() # 대기열에 이미 있는 (채널, 영상)
+        self._in_progress = set() # 지금 보내고 있는 (채널, 영상)
+        self._rerun = set() # 보내는 중에 새 소식이 와서 끝나고 다시 봐야 하는 것
+        self._attempts = {} # (채널, 영상) -> 실패한 횟수
+        self._events = {} # 영상 ID -> {'start': 시작 소식, 'end': 종료 소식}
+        self.sent = set() # 이미 보낸 (채널, 영상, 이벤트) - 중복 전송 방지 키
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def load_sent(self, sent_keys):
+        self.sent.update(sent_keys)
+
+    def publish(self, event, video_id, live_start_time, live_end_time=None, channel_ids=None):
+        # 라이브 확인 루프에서 불러. 바로 돌아오고, 실제 전송은 워커들이 해.
+        news = self._events.setdefault(video_id, {})
+        news[event] = {'start_time': live_start_time, 'end_time': live_end_time, 'published': self.clock()}
+        for channel_id in (alert_channels.values() if channel_ids is None else channel_ids):
+            self._enqueue((channel_id, video_id))
+
+    def _enqueue(self, item):
+        if item in self._in_progress:
+            self._rerun.add(item)
+            return
+        if item in self._queued:
+            return
+        self._queued.add(item)
+        self._idle.clear()
+        self._queue.put_nowait(item)
+        NOTIFY_QUEUE_SIZE.set(len(self._queued))
+
+    def _next_message(self, channel_id, video_id):
+        # 이 채널에 아직 안 보낸 소식을 보고 보낼 메시지와 중복 방지 키를 정해.
+        news = self._events.get(video_id, {})
+        start = news.get('start')
+        end = news.get('end')
+        start_sent = (channel_id, video_id, 'start') in self.sent or (channel_id, video_id, 'start_end') in self.sent
+        end_sent = (channel_id, video_id, 'end') in self.sent or (channel_id, video_id, 'start_end') in self.sent
+        if start and not start_sent:
+            if end and not end_sent:
+                return ('start_end',), format_live_start_end_message(video_id, start['start_time'], end['end_time']), start
+            return ('start',), format_live_start_message(video_id, start['start_time']), start
+        if end and not end_sent:
+            return ('end',), format_live_end_message(end['start_time'], end['end_time']), end
+        return None
+
+    async def _deliver(self, item):
+        channel_id, video_id = item
+        next_message = self._next_message(channel_id, video_id)
+        if next_message is None:
+            return
+        events, message_text, news = next_message
+        channel = client.get_channel(channel_id)
+        if channel is None:
+            DISCORD_SEND_FAILURES.labels(kind='alert').inc()
+            log.error(f"디스코드 채널 ID {channel_id}를 찾을 수 없습니다.", extra={'discord_channel_id': channel_id})
+            return
+
+        started = time.perf_counter()
+        try:
+            await channel.send(message_text)
+        except Exception as e:
+            DISCORD_SEND_FAILURES.labels(kind='alert').inc()
+            attempts = self._attempts.get(item, 0) + 1
+            if is_permanent_send_error(e) or attempts >= NOTIFY_MAX_ATTEMPTS:
+                self._attempts.pop(item, None)
+                log.error(f"디스코드 알림 전송 포기 (채널 ID {channel_id}, {attempts}번 시도): {e}",
+                          extra={'discord_channel_id': channel_id, 'video_id': video_id})
+                return
+            self._attempts[item] = attempts
+            delay = retry_delay_for(e, attempts - 1)
+            log.warning(f"디스코드 알림 전송 실패 (채널 ID {channel_id}): {e}. {delay:.1f}초 뒤에 다시 보낼게.",
+                        extra={'discord_channel_id': channel_id, 'video_id': video_id, 'attempt': attempts})
+            self._idle.clear()
+            asyncio.get_running_loop().call_later(delay, self._enqueue, item)
+            return
+        finally:
+            DISCORD_SEND_LATENCY.labels(kind='alert').observe(time.perf_counter() - started)
+
+        self._attempts.pop(item, None)
+        NOTIFY_DELIVERY_LATENCY.observe(self.clock() - news['published'])
+        for event in events:
+            self.sent.add((channel_id, video_id, event))
+            if state_store:
+                state_store.record_sent_notification(channel_id, video_id, event)
+        if events == ('start_end',):
+            NOTIFY_COALESCED.inc()
+        # 시작을 보낸 뒤에 종료 소식이 왔을 수도 있으니 한 번 더 봐.
+        if self._next_message(channel_id, video_id) is not None:
+            self._rerun.add(item)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            self._queued.discard(item)
+            self._in_progress.add(item)
+            NOTIFY_QUEUE_SIZE.set(len(self._queued))
+            try:
+                await self._deliver(item)
+            except Exception:
+                log.exception(f"알림 전송 중 오류 발생: {item}")
+            finally:
+                self._in_progress.discard(item)
+                self._queue.task_done()
+                if item in self._rerun:
+                    self._rerun.discard(item)
+                    self._enqueue(item)
+                elif not self._queued and not self._in_progress and not self._attempts:
+                    self._forget_finished()
+                    self._idle.set()
+
+    def _forget_finished(self):
+        # 다 보낸 상태에서 종료까지 끝난 방송은 더 보낼 게 없으니 잊어. (중복 방지 키는 self.sent에 남아)
+        for video_id in [v for v, news in self._events.items() if 'end' in news]:
+            del self._events[video_id]
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    async def drain(self):
+        # 대기열과 재시도가 모두 끝날 때까지 기다려. (벤치마크/종료용)
+        await self._idle.wait()
+
+notifier = NotificationDispatcher()
+
+def announce_live_start(youtube_channel_id, live_video_id, live_start_time):
+    if not owns_channel(youtube_channel_id):
+        # 확인하는 사이에 임대가 끝났으면 새 주인이 알릴 거야.
+        log.warning(f"채널 임대가 없어서 라이브 시작 알림을 건너뜀 ({youtube_channel_id})")
+        return
+    if not alert_channels:
+        log.warning("디스코드 메시지를 보낼 채널 ID가 설정되지 않았습니다. `!채널설정` 명령을 사용해주세요.")
+    publish_live_event('start', youtube_channel_id, live_video_id, live_start_time)
+    log.info(f"라이브 시작 알림 대기열에 넣음 ({youtube_channel_id}): {live_start_time}",
+             extra={'youtube_channel_id': youtube_channel_id, 'video_id': live_video_id, 'event': 'live_start',
+                    'alert_channels': len(alert_channels)})
+
+def announce_live_end(youtube_channel_id, live_video_id, live_start_time, live_end_time):
+    if not owns_channel(youtube_channel_id):
+        log.warning(f"채널 임대가 없어서 라이브 종료 알림을 건너뜀 ({youtube_channel_id})")
+        return
+    publish_live_event('end', youtube_channel_id, live_video_id, live_start_time, live_end_time)
+    log.info(f"라이브 종료 알림 대기열에 넣음 ({youtube_channel_id}): {live_end_time}",
+             extra={'youtube_channel_id': youtube_channel_id, 'video_id': live_video_id, 'event': 'live_end',
+                    'duration_seconds': int((live_end_time - live_start_time).total_seconds())})
+
+def announce_live_start_end(youtube_channel_id, live_video_id, live_start_time, live_end_time):
+    # 시작과 종료를 연달아 넣으면 아직 시작 알림을 못 보낸 상태라 디스패처가 한 메시지로 합쳐 보내.
+    if not owns_channel(youtube_channel_id):
+        log.warning(f"채널 임대가 없어서 라이브 시작/종료 알림을 건너뜀 ({youtube_channel_id})")
+        return
+    publish_live_event('start', youtube_channel_id, live_video_id, live_start_time)
+    publish_live_event('end', youtube_channel_id, live_video_id, live_start_time, live_end_time)
+    log.info(f"확인 사이에 끝난 라이브 알림 대기열에 넣음 ({youtube_channel_id}): {live_start_time} ~ {live_end_time}",
+             extra={'youtube_channel_id': youtube_channel_id, 'video_id': live_video_id, 'event': 'live_start_end',
+                    'duration_seconds': int((live_end_time - live_start_time).total_seconds())})
+
+# --- 유튜브 라이브 상태 확인 (한 주기) ---
+async def poll_live_channels_once(youtube, channel_ids, extra_candidates=None, quota=None):
+    # extra_candidates: WebSub 푸시로 받은 영상처럼 꼭 같이 확인할 영상 (영상 ID -> 채널 ID)
+    # quota: 이번 주기에 쓴 쿼터를 셀 QuotaTally (중간에 실패해도 부른 쪽에서 쓴 만큼 알 수 있게 넘겨 받아)
+    # (채널별 관찰 결과, 이번 주기에 쓴 쿼터)를 돌려줘.
+    quota = quota or QuotaTally()
+    cycle_started = time.perf_counter()
+    checked_at = datetime.datetime.now(datetime.timezone.utc)
+
+    # 1. 채널마다 후보 영상 모으기 (지금 방송 중인 영상은 항상 후보에 넣어서 종료를 놓치지 않게!)
+    found = await asyncio.gather(
+        *(fetch_candidate_video_ids(youtube, channel_id, quota) for channel_id in channel_ids),
+        return_exceptions=True
+    )
+    candidates = {} # 영상 ID -> 채널 ID
+    checked = set() # 후보 영상을 제대로 찾은 채널
+    for channel_id, video_ids in zip(channel_ids, found):
+        if isinstance(video_ids, Exception):
+            log.warning(f"후보 영상 찾기 실패 ({channel_id}): {video_ids!r}")
+        else:
+            checked.add(channel_id)
+            for video_id in video_ids:
+                candidates.setdefault(video_id, channel_id)
+        session = live_sessions.get(channel_id)
+        if session:
+            candidates.setdefault(session['video_id'], channel_id)
+    for video_id, channel_id in (extra_candidates or {}).items():
+        candidates.setdefault(video_id, channel_id)
+
+    # 2. 후보 영상들을 50개씩 묶어서 라이브 상태 확인
+    details = await fetch_live_details(youtube, list(candidates), quota, candidates)
+
+    live_now = {} # 채널 ID -> (영상 ID, 라이브 정보)
+    scheduled_starts = {} # 채널 ID -> 가장 가까운 예정 시작 시간
+    missed = [] # 지난 확인 뒤에 시작해서 이번 확인 전에 끝나 버린 방송 (채널 ID, 영상 ID, 시작, 종료)
+    for video_id, live_details in details.items():
+        channel_id = candidates[video_id]
+        if is_live_now(live_details):
+            live_now.setdefault(channel_id, (video_id, live_details))
+        elif 'actualStartTime' in live_details and 'actualEndTime' in live_details:
+            # 방송 중인 걸 한 번도 못 봤어도 (확인 간격이 최대 15분이라) 시작 후 종료를 한 메시지로 알려.
+            # 재시작하거나 새로 맡은 채널은 지난 확인 시각이 없으니까 옛날 방송을 알리지 않아.
+            previous_check = live_checked_at.get(channel_id)
+            session = live_sessions.get(channel_id)
+            live_start_time = parse_youtube_time(live_details['actualStartTime'])
+            # 유튜브 시각은 초 단위라서 지난 확인 시각도 초 단위로 잘라서 비교해.
+            if previous_check is not None and live_start_time >= previous_check.replace(microsecond=0) \
+                    and (session is None or session['video_id'] != video_id):
+                missed.append((channel_id, video_id, live_start_time, parse_youtube_time(live_details['actualEndTime'])))
+        elif 'scheduledStartTime' in live_details and 'actualStartTime' not in live_details:
+            scheduled_start = parse_youtube_time(live_details['scheduledStartTime'])
+            if channel_id not in scheduled_starts or scheduled_start < scheduled_starts[channel_id]:
+                scheduled_starts[channel_id] = scheduled_start
+
+    # 3. 채널별로 시작/종료 판단
+    # 확인하는 사이에 임대를 넘겨준 채널은 상태를 건드리지 않아. (새 주인이 저장한 방송 상태를 덮어쓰면 안 돼)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    released = {channel_id for channel_id in channel_ids if not owns_channel(channel_id)}
+    if released:
+        log.warning(f"확인하는 사이에 임대가 끝난 채널 {len(released)}개는 결과를 버릴게.",
+                    extra={'channels': sorted(released)})
+    for channel_id in channel_ids:
+        if channel_id in released:
+            continue
+        session = live_sessions.get(channel_id)
+        if channel_id in live_now:
+            live_video_id, live_details = live_now[channel_id]
+            if not session: # 이전에 라이브 중이 아니었는데 지금 라이브가 시작됐다면!
+                # 시작 시간은 유튜브가 알려주는 실제 시작 시간으로 기록! (재시작해도 안 바뀌게)
+                live_start_time = parse_youtube_time(live_details['actualStartTime'])
+                session = {'video_id': live_video_id, 'start_time': live_start_time, 'last_seen': now}
+                live_sessions[channel_id] = session
+                if state_store:
+                    state_store.save_live_session(channel_id, session)
+                announce_live_start(channel_id, live_video_id, live_start_time)
+            else:
+                session['last_seen'] = now
+                if state_store:
+                    state_store.save_live_session(channel_id, session)
+                log.debug(f"라이브 방송 진행 중... ({channel_id})")
+        elif session: # 이전에 라이브 중이었는데 지금 라이브가 끝났다면!
+            ended = details.get(session['video_id'], {})
+            if 'actualEndTime' in ended:
+                live_end_time = parse_youtube_time(ended['actualEndTime'])
+            else:
+                live_end_time = now # 영상이 지워졌으면 지금을 종료 시간으로 기록!
+            del live_sessions[channel_id]
+            if state_store:
+                state_store.delete_live_session(channel_id)
+            record_finished_broadcast(channel_id, session['video_id'], session['start_time'], live_end_time)
+            announce_live_end(channel_id, session['video_id'], session['start_time'], live_end_time)
+    for channel_id, video_id, live_start_time, live_end_time in missed:
+        if channel_id in released:
+            continue
+        record_finished_broadcast(channel_id, video_id, live_start_time, live_end_time)
+        announce_live_start_end(channel_id, video_id, live_start_time, live_end_time)
+    for channel_id in checked - released:
+        live_checked_at[channel_id] = checked_at
+
+    batches = -(-len(candidates) // VIDEOS_LIST_BATCH_SIZE)
+    cycle_seconds = time.perf_counter() - cycle_started
+    POLL_CYCLE_SECONDS.observe(cycle_seconds)
+    log.info(f"확인 완료: 채널 {len(channel_ids)}개, 후보 영상 {len(candidates)}개, "
+             f"videos().list {batches}번, 방송 중 {len(live_now)}개, 이번 주기 쿼터 {quota.units} 유닛",
+             extra={'channels': len(channel_ids), 'candidates': len(candidates), 'batches': batches,
+                    'live': len(live_now), 'quota_units': quota.units, 'cycle_seconds': round(cycle_seconds, 3)})
+
+    # 스케줄러가 다음 확인 시간을 정할 수 있게 채널별로 본 것을 돌려줘. (후보를 못 찾은 채널은 빠져)
+    observations = {
+        channel_id: {'live': channel_id in live_now, 'scheduled_start': scheduled_starts.get(channel_id)}
+        for channel_id in channel_ids
+        if channel_id in checked or channel_id in live_now
+    }
+    return observations, quota.units
+
+# --- 채널별 확인 일정 짜기 ---
+# 모든 채널을 똑같이 60초마다 보면 일주일째 조용한 채널에도 쿼터를 쓰고,
+# 방송이 곧 시작하는 채널은 오히려 늦게 알아채. 그래서 채널마다 다음 확인 시간을 따로 정할 거야.
+LIVE_POLL_INTERVAL_SECONDS = 30 # 방송 중: 종료를 빨리 알아채게
+SCHEDULED_POLL_INTERVAL_SECONDS = 20 # 예정된 시작 시간 근처
+SCHEDULED_WINDOW_SECONDS = 10 * 60 # 예정 시간 10분 전부터 자주 봐
+SCHEDULED_GRACE_SECONDS = 30 * 60 # 예정 시간이 지나도 30분까지는 늦게 시작할 수 있으니까 계속 자주 봐
+MAX_IDLE_POLL_INTERVAL_SECONDS = 15 * 60 # 조용한 채널도 최소 15분에 한 번은 봐
+POLL_JITTER_RATIO = 0.1 # 다음 확인 시간을 ±10% 흔들어서 한꺼번에 몰리지 않게
+POLL_QUOTA_BUDGET_PER_DAY = int(os.environ.get('POLL_QUOTA_BUDGET_PER_DAY', 8000)) # 라이브 확인에 쓸 하루 쿼터 (나머지는 `!링크` 몫)
+
+class QuotaBudget:
+    # 하루 예산을 초 단위로 조금씩 채워 주는 토큰 버킷이야.
+    def __init__(self, units_per_day=POLL_QUOTA_BUDGET_PER_DAY, clock=time.monotonic):
+        self.capacity = units_per_day / 24 # 한 번에 몰아 쓸 수 있는 건 1시간 분량까지
+        self.refill_per_second = units_per_day / 86400
+        self.clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def spend(self, units):
+        self._refill()
+        self._available -= units # 마이너스가 되면 다음 확인을 미뤄서 갚아
+
+    def wait_time(self):
+        # 예산이 바닥났으면 다시 0 이상이 될 때까지 기다릴 시간 (초)
+        self._refill()
+        if self._available >= 0:
+            return 0
+        return -self._available / self.refill_per_second
+
+class PollScheduler:
+    def __init__(self, base_interval=CHECK_INTERVAL_SECONDS, clock=time.monotonic, rng=random.random,
+                 push_active=lambda channel_id: False):
+        self.base_interval = base_interval
+        self.clock = clock
+        self.rng = rng
+        self.push_active = push_active # WebSub 푸시를 받고 있는 채널인지 알려주는 함수
+        self._heap = [] # (다음 확인 시각, 채널 ID) - 가장 빠른 게 맨 앞
+        self._next_check = {} # 채널 ID -> 다음 확인 시각 (힙에 남은 옛날 항목은 이걸로 걸러)
+        self._idle_checks = {} # 채널 ID -> 연속으로 조용했던 횟수
+        self._watched = set()
+
+    def _push(self, channel_id, when):
+        self._next_check[channel_id] = when
+        heapq.heappush(self._heap, (when, channel_id))
+
+    def sync_channels(self, channel_ids):
+        # 새로 추가된 채널은 바로 확인하고, 빠진 채널은 일정에서 지워.
+        now = self.clock()
+        for channel_id in channel_ids:
+            if channel_id not in self._watched:
+                self._watched.add(channel_id)
+                self._push(channel_id, now)
+        for channel_id in self._watched - set(channel_ids):
+            self._watched.discard(channel_id)
+            self._next_check.pop(channel_id, None)
+            self._idle_checks.pop(channel_id, None)
+
+    def pop_due(self):
+        now = self.clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, channel_id = heapq.heappop(self._heap)
+            if self._next_check.get(channel_id) == when:
+                del self._next_check[channel_id]
+                due.append(channel_id)
+        return due
+
+    def mark_due(self, channel_id):
+        # 푸시 알림이 온 채널은 다음 차례를 기다리지 않고 바로 확인해.
+        if channel_id in self._watched:
+            self._push(channel_id, self.clock())
+
+    def seconds_until_next(self):
+        while self._heap and self._next_check.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap) # 지워진 채널의 옛날 항목 정리
+        if not self._heap:
+            return None
+        return max(0, self._heap[0][0] - self.clock())
+
+    def interval_for(self, channel_id, observation, now_utc):
+        if observation is None: # 확인 실패: 기본 간격으로 다시 시도
+            return self.base_interval
+        if observation['live']:
+            self._idle_checks[channel_id] = 0
+            return LIVE_POLL_INTERVAL_SECONDS
+        scheduled_start = observation['scheduled_start']
+        if scheduled_start is not None:
+            until_start = (scheduled_start - now_utc).total_seconds()
+            if -SCHEDULED_GRACE_SECONDS <= until_start <= SCHEDULED_WINDOW_SECONDS:
+                self._idle_checks[channel_id] = 0
+                return SCHEDULED_POLL_INTERVAL_SECONDS
+        # 조용한 채널은 확인 간격을 두 배씩 늘려 (60초 -> 2분 -> 4분 ... 최대 15분)
+        # WebSub 푸시를 받는 채널은 푸시가 놓친 걸 맞춰 보는 용도라 더 느리게 봐도 돼.
+        idle_checks = self._idle_checks.get(channel_id, 0)
+        self._idle_checks[channel_id] = idle_checks + 1
+        max_interval = WEBSUB_RECONCILE_INTERVAL_SECONDS if self.push_active(channel_id) else MAX_IDLE_POLL_INTERVAL_SECONDS
+        interval = min(max_interval, self.base_interval * (2 ** min(idle_checks, 16)))
+        if scheduled_start is not None and until_start > SCHEDULED_WINDOW_SECONDS:
+            # 예정 시간 10분 전에는 꼭 깨어나게
+            interval = min(interval, until_start - SCHEDULED_WINDOW_SECONDS)
+        return interval
+
+    def reschedule(self, channel_id, observation, now_utc):
+        if channel_id not in self._watched: # 확인하는 사이에 목록에서 빠진 채널
+            return
+        interval = self.interval_for(channel_id, observation, now_utc)
+        jitter = 1 + POLL_JITTER_RATIO * (2 * self.rng() - 1)
+        self._push(channel_id, self.clock() + interval * jitter)
+
+# --- 여러 프로세스로 나눠 돌리기 (스케일 아웃) ---
+# SCALE_OUT=1이면 같은 STATE_DB_PATH(SQLite 파일 하나)를 쓰는 여러 봇 프로세스가 일을 나눠.
+# - 살아 있는 프로세스들로 해시 링을 만들고, 유튜브 채널마다 링에서 주인이 될 프로세스를 정해. (일관된 해싱)
+# - 주인은 채널마다 짧은 임대(lease)를 DB에 잡고 계속 연장해. 임대를 가진 프로세스만 그 채널을 확인하고 알림을 내.
+# - 프로세스가 죽으면 하트비트와 임대가 LEASE_SECONDS 안에 만료되고, 남은 프로세스가 링을 다시 계산해서 가져가.
+#   정상 종료할 때는 임대를 바로 내려놓아서 기다릴 필요가 없어.
+# - 라이브 시작/종료는 DB의 live_events에 한 번만 기록되고, 프로세스마다 자기 샤드에 있는 서버에만 알림을 보내.
+# 디스코드 쪽은 프로세스마다 DISCORD_SHARD_IDS를 겹치지 않게 나눠 줘. 없으면 시작하지 않아. (아래 "디스코드 샤딩" 참고)
+SCALE_OUT = os.environ.get('SCALE_OUT') == '1'
+WORKER_ID = os.environ.get('WORKER_ID') or f'{socket.gethostname()}-{os.getpid()}'
+LEASE_SECONDS = float(os.environ.get('LEASE_SECONDS', 15)) # 임대/하트비트 유효 시간 (죽은 프로세스 일을 넘겨받기까지 걸리는 시간)
+LEASE_RENEW_SECONDS = float(os.environ.get('LEASE_RENEW_SECONDS', 5)) # 임대를 몇 초마다 연장할지
+LEASE_SAFETY_SECONDS = 2 # 시계 차이나 DB 지연을 생각해서 임대가 끝나기 조금 전에 스스로 손을 떼
+HASH_RING_VNODES = 64 # 프로세스마다 링에 올릴 가상 노드 수 (많을수록 채널이 고르게 나뉘어)
+LIVE_EVENT_POLL_SECONDS = 1 # 다른 프로세스가 남긴 라이브 시작/종료를 몇 초마다 읽을지
+LIVE_EVENT_REPLAY_SECONDS = 10 * 60 # 재시작하면 최근 10분 동안의 라이브 시작/종료를 다시 훑어 봐 (이미 보낸 건 건너뛰어)
+STATS_SYNC_INTERVAL_SECONDS = 5 * 60 # 다른 프로세스가 모은 방송 기록을 몇 초마다 읽어 올지
+
+OWNED_CHANNELS = Gauge('owned_youtube_channels', '이 프로세스가 임대를 가지고 확인하는 유튜브 채널 수')
+CLUSTER_WORKERS = Gauge('cluster_workers', '살아 있는 봇 프로세스 수')
+LEASE_SYNC_ERRORS = Counter('lease_sync_errors_total', '실패한 임대 연장 수')
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class HashRing:
+    def __init__(self, members, vnodes=HASH_RING_VNODES):
+        self._ring = sorted((ring_hash(f'{member}#{i}'), member) for member in members for i in range(vnodes))
+        self._keys = [key for key, _ in self._ring]
+
+    def owner(self, key):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, ring_hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+class ChannelLeaseCoordinator:
+    # 메서드는 전부 블로킹이라 이벤트 루프에서는 asyncio.to_thread로 불러.
+    def __init__(self, path=STATE_DB_PATH, worker_id=WORKER_ID, lease_seconds=LEASE_SECONDS, clock=time.time):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat_ts REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS channel_leases (
+                youtube_channel_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_ts REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS live_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                youtube_channel_id TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                start_time TEXT NOT NULL,
+                end_time TEXT,
+                created_ts REAL NOT NULL,
+                UNIQUE (video_id, event)
+            );
+        ''')
+        self._lock = threading.Lock()
+        self.owned = set() # 임대를 가진 채널 (이벤트 루프에서만 바꿔)
+        self.valid_until = 0 # 이 시각까지만 임대를 믿어
+        self.members = []
+        self.pending_events = [] # 아직 DB에 안 쓴 라이브 시작/종료
+
+    def owns(self, channel_id):
+        return channel_id in self.owned and self.clock() < self.valid_until
+
+    def claim(self, channel_ids):
+        # 하트비트를 남기고, 링에서 내 몫인 채널의 임대를 잡거나 연장해.
+        # (가진 임대, 링이 바뀌어서 내려놓아야 할 임대, 임대를 믿어도 되는 시각)을 돌려줘.
+        now = self.clock()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    'INSERT INTO workers (worker_id, heartbeat_ts) VALUES (?, ?) '
+                    'ON CONFLICT (worker_id) DO UPDATE SET heartbeat_ts = excluded.heartbeat_ts',
+                    (self.worker_id, now)
+                )
+                self._conn.execute('DELETE FROM workers WHERE heartbeat_ts < ?', (now - 10 * self.lease_seconds,))
+                members = [row[0] for row in self._conn.execute(
+                    'SELECT worker_id FROM workers WHERE heartbeat_ts >= ? ORDER BY worker_id', (now - self.lease_seconds,)
+                )]
+                ring = HashRing(members)
+                wanted = {channel_id for channel_id in channel_ids if ring.owner(channel_id) == self.worker_id}
+                # 비어 있거나, 만료됐거나, 원래 내 것인 임대만 잡혀.
+                self._conn.executemany(
+                    'INSERT INTO channel_leases (youtube_channel_id, owner, expires_ts) VALUES (?, ?, ?) '
+                    'ON CONFLICT (youtube_channel_id) DO UPDATE SET owner = excluded.owner, expires_ts = excluded.expires_ts '
+                    'WHERE channel_leases.owner = excluded.owner OR channel_leases.expires_ts < ?',
+                    [(channel_id, self.worker_id, now + self.lease_seconds, now) for channel_id in wanted]
+                )
+                held = {row[0] for row in self._conn.execute(
+                    'SELECT youtube_channel_id FROM channel_leases WHERE owner = ? AND expires_ts > ?', (self.worker_id, now)
+                )}
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        self.members = members
+        return held, held - wanted, now + self.lease_seconds - LEASE_SAFETY_SECONDS
+
+    def release(self, channel_ids):
+        with self._lock:
+            self._conn.executemany(
+                'DELETE FROM channel_leases WHERE youtube_channel_id = ? AND owner = ?',
+                [(channel_id, self.worker_id) for channel_id in channel_ids]
+            )
+
+    def leave(self):
+        # 정상 종료: 하트비트와 임대를 지워서 다른 프로세스가 바로 가져가게 해.
+        with self._lock:
+            self._conn.execute('DELETE FROM channel_leases WHERE owner = ?', (self.worker_id,))
+            self._conn.execute('DELETE FROM workers WHERE worker_id = ?', (self.worker_id,))
+
+    def append_events(self, events):
+        # 같은 영상의 같은 이벤트는 한 번만 남아. (주인이 바뀌는 사이에 두 번 감지해도 알림은 한 번)
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO live_events (event, youtube_channel_id, video_id, start_time, end_time, created_ts) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                events
+            )
+
+    def read_events(self, after_id, limit=500):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT id, event, youtube_channel_id, video_id, start_time, end_time FROM live_events '
+                'WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit)
+            ).fetchall()
+
+    def last_event_id_before(self, created_ts):
+        with self._lock:
+            row = self._conn.execute('SELECT MAX(id) FROM live_events WHERE created_ts < ?', (created_ts,)).fetchone()
+        return row[0] or 0
+
+    def prune_events(self, before_ts):
+        with self._lock:
+            self._conn.execute('DELETE FROM live_events WHERE created_ts < ?', (before_ts,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+coordinator = None # SCALE_OUT일 때 봇 실행 시작점에서 ChannelLeaseCoordinator로 만들어
+
+def owns_channel(channel_id):
+    # 혼자 돌 때는 항상 내 채널이야.
+    return coordinator is None or coordinator.owns(channel_id)
+
+def owned_channel_ids():
+    # 이 프로세스가 확인할 채널. 혼자 돌 때는 감시하는 채널 전부야.
+    channel_ids = get_watched_channel_ids()
+    if coordinator is None:
+        return channel_ids
+    return [channel_id for channel_id in channel_ids if coordinator.owns(channel_id)]
+
+async def sync_channel_leases():
+    previous = set(coordinator.owned)
+    held, releasing, valid_until = await asyncio.to_thread(coordinator.claim, get_watched_channel_ids())
+    coordinator.owned = held - releasing
+    coordinator.valid_until = valid_until
+
+    # 링이 바뀌어서 넘겨줄 채널: 방송 상태를 DB에 저장한 다음 임대를 내려놓아.
+    if releasing:
+        if state_store:
+            await state_store.flush()
+        for channel_id in releasing:
+            live_sessions.pop(channel_id, None)
+            live_checked_at.pop(channel_id, None)
+        await asyncio.to_thread(coordinator.release, releasing)
+        log.info(f"유튜브 채널 {len(releasing)}개를 다른 프로세스에 넘겨줌", extra={'channels': sorted(releasing)})
+
+    # live_sessions에는 내가 확인하는 채널만 남겨. (임대를 뺏긴 채널 포함)
+    lost = [channel_id for channel_id in live_sessions if channel_id not in coordinator.owned]
+    for channel_id in lost:
+        del live_sessions[channel_id]
+    for channel_id in [channel_id for channel_id in live_checked_at if channel_id not in coordinator.owned]:
+        del live_checked_at[channel_id]
+
+    # 새로 맡은 채널은 이전 주인이 저장한 방송 상태부터 이어서 확인해.
+    acquired = coordinator.owned - previous
+    if acquired:
+        sessions = await asyncio.to_thread(state_store.load_live_sessions, acquired) if state_store else {}
+        for channel_id in acquired:
+            if channel_id in sessions:
+                live_sessions[channel_id] = sessions[channel_id]
+            else:
+                live_sessions.pop(channel_id, None)
+        log.info(f"유튜브 채널 {len(acquired)}개를 새로 맡음", extra={'channels': sorted(acquired)})
+        poll_wakeup.set() # 새 채널은 바로 확인하게 깨워
+
+    OWNED_CHANNELS.set(len(coordinator.owned))
+    CLUSTER_WORKERS.set(len(coordinator.members))
+
+async def keep_channel_leases():
+    while True:
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+        try:
+            await sync_channel_leases()
+        except Exception as e:
+            # 연장에 실패하면 valid_until이 지나는 순간 스스로 채널 확인을 멈춰.
+            LEASE_SYNC_ERRORS.inc()
+            log.error(f"채널 임대 연장 실패: {e!r}")
+
+def is_local_guild(guild_id):
+    # 샤드를 나눠 맡았으면 내 샤드에 있는 서버만 내 몫이야. (디스코드 샤드 계산 공식)
+    if DISCORD_SHARD_IDS is None:
+        return True
+    return (guild_id >> 22) % DISCORD_SHARD_COUNT in DISCORD_SHARD_IDS
+
+def publish_live_event(event, youtube_channel_id, video_id, live_start_time, live_end_time=None):
+    if coordinator is None:
+        notifier.publish(event, video_id, live_start_time, live_end_time)
+        return
+    coordinator.pending_events.append((
+        event, youtube_channel_id, video_id, live_start_time.isoformat(),
+        live_end_time.isoformat() if live_end_time else None, time.time()
+    ))
+
+async def relay_live_events():
+    # 내가 감지한 라이브 시작/종료를 DB에 쓰고, 모든 프로세스가 감지한 것을 읽어서 내 서버들에 알림을 보내.
+    await asyncio.to_thread(coordinator.prune_events, time.time() - SENT_NOTIFICATION_KEEP_DAYS * 24 * 3600)
+    last_id = await asyncio.to_thread(coordinator.last_event_id_before, time.time() - LIVE_EVENT_REPLAY_SECONDS)
+    while True:
+        try:
+            if coordinator.pending_events:
+                events, coordinator.pending_events = coordinator.pending_events, []
+                try:
+                    await asyncio.to_thread(coordinator.append_events, events)
+                except Exception:
+                    coordinator.pending_events = events + coordinator.pending_events
+                    raise
+            for event_id, event, youtube_channel_id, video_id, start_time, end_time in \
+                    await asyncio.to_thread(coordinator.read_events, last_id):
+                last_id = event_id
+                channel_ids = [channel_id for guild_id, channel_id in alert_channels.items() if is_local_guild(guild_id)]
+                notifier.publish(event, video_id, datetime.datetime.fromisoformat(start_time),
+                                 datetime.datetime.fromisoformat(end_time) if end_time else None, channel_ids)
+        except Exception as e:
+            log.error(f"라이브 이벤트 주고받기 실패: {e!r}")
+        await asyncio.sleep(LIVE_EVENT_POLL_SECONDS)
+
+async def sync_broadcast_history():
+    # 다른 프로세스가 맡은 채널의 방송 기록도 `!통계`에 보이게 가끔 DB에서 다시 읽어.
+    while True:
+        await asyncio.sleep(STATS_SYNC_INTERVAL_SECONDS)
+        try:
+            rows = await asyncio.to_thread(state_store.load_broadcasts)
+            backfill = await asyncio.to_thread(state_store.load_backfill_state)
+        except Exception as e:
+            log.error(f"방송 기록 다시 읽기 실패: {e!r}")
+            continue
+        for row in rows:
+            broadcast_stats.add(*row)
+        for channel_id, state in backfill.items():
+            if not coordinator.owns(channel_id): # 내가 불러오는 중인 채널은 메모리 쪽이 더 최신이야
+                broadcast_backfill[channel_id] = state
+
+async def leave_cluster():
+    # 아직 안 쓴 이벤트를 쓰고 임대를 내려놓아. (상태는 stop_services에서 먼저 저장해)
+    try:
+        if coordinator.pending_events:
+            await asyncio.to_thread(coordinator.append_events, coordinator.pending_events)
+            coordinator.pending_events = []
+        await asyncio.to_thread(coordinator.leave)
+        coordinator.owned = set()
+    except Exception as e:
+        log.error(f"채널 임대 내려놓기 실패: {e!r}")
+
 # --- 유튜브 라이브 상태 확인 함수 (주기적으로 실행될 거야!) ---
-async def check_youtube_live_status():
-    global is_live, live_start_time, live_end_time, target_channel_id
+async def sleep_until_wakeup(timeout):
+    # 푸시가 오거나 timeout초가 지날 때까지 자.
+    # asyncio.wait_for는 (파이썬 3.11) 깨우는 신호와 취소가 같이 오면 취소를 삼켜서
+    # 종료할 때 확인 루프가 안 멈출 수 있어. 그래서 asyncio.wait로 기다려.
+    waiter = asyncio.ensure_future(poll_wakeup.wait())
+    try:
+        await asyncio.wait((waiter,), timeout=timeout)
+    finally:
+        waiter.cancel()
+    poll_wakeup.clear()
 
+async def check_youtube_live_status():
     # 봇이 완전히 준비될 때까지 기다려.
     await client.wait_until_ready()
 
+    # 간격과 예산은 여기서 읽어서 넘겨. (벤치마크가 시간을 빨리 돌리려고 값을 바꿀 수 있게)
+    scheduler = PollScheduler(CHECK_INTERVAL_SECONDS, push_active=websub_lease_active)
+    budget = QuotaBudget(POLL_QUOTA_BUDGET_PER_DAY)
+
     # 봇이 살아있는 동안 계속 반복할 거야.
     while not client.is_closed():
-        print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] 유튜브 라이브 상태 확인 중...")
+        # 감시할 채널 목록은 Secrets(YOUTUBE_CHANNEL_IDS 또는 YOUTUBE_CHANNEL_ID)에서 가져옵니다.
+        # 여러 프로세스로 나눠 돌 때는 이 프로세스가 임대를 가진 채널만 확인해.
+        channel_ids = owned_channel_ids()
+        scheduler.sync_channels(channel_ids)
+        if not channel_ids:
+            if not get_watched_channel_ids():
+                log.warning("YOUTUBE_CHANNEL_IDS 환경 변수가 설정되지 않았습니다. 실시간 감지 기능을 사용할 수 없습니다.")
+            # 잠시 기다렸다가 다시 시도 (채널을 새로 맡으면 바로 깨어나)
+            await sleep_until_wakeup(CHECK_INTERVAL_SECONDS)
+            continue # 다음 루프로 건너뛰기
+
+        # 하루 쿼터 예산을 넘겼으면 채워질 때까지 쉬어.
+        wait_seconds = budget.wait_time()
+        if wait_seconds > 0:
+            log.warning(f"라이브 확인 쿼터 예산 초과. {wait_seconds:.0f}초 쉬었다가 확인할게.")
+            await asyncio.sleep(min(wait_seconds, CHECK_INTERVAL_SECONDS))
+            continue
+
+        # 푸시로 들어온 영상이 있으면 그 채널은 지금 바로 확인해.
+        pushed = dict(pushed_videos)
+        pushed_videos.clear()
+        for channel_id in pushed.values():
+            scheduler.mark_due(channel_id)
+
+        # 확인할 때가 된 채널만 한꺼번에 확인해. (videos().list 묶음 요청을 같이 쓰려고)
+        due_channel_ids = scheduler.pop_due()
+        if due_channel_ids:
+            log.debug(f"유튜브 라이브 상태 확인 중... (채널 {len(due_channel_ids)}개)")
+            observations = {}
+            extra_candidates = {video_id: channel_id for video_id, channel_id in pushed.items() if channel_id in due_channel_ids}
+            quota = QuotaTally() # 실패한 주기도 그때까지 쓴 쿼터는 예산에 달아야 하니까 여기서 만들어 넘겨
+            try:
+                observations, _ = await poll_live_channels_once(youtube_api, due_channel_ids, extra_candidates, quota)
+            except asyncio.TimeoutError:
+                POLL_CYCLE_ERRORS.inc()
+                log.warning("유튜브 API 응답이 너무 늦어서 이번 확인은 건너뛸게.")
+            except Exception as e:
+                POLL_CYCLE_ERRORS.inc()
+                log.exception(f"유튜브 API 호출 중 오류 발생: {e}")
+            budget.spend(quota.units)
+
+            now_utc = datetime.datetime.now(datetime.timezone.utc)
+            for channel_id in due_channel_ids:
+                scheduler.reschedule(channel_id, observations.get(channel_id), now_utc)
+
+        # 다음 확인할 채널 차례까지 기다려. (채널 목록이 바뀌었을 수도 있으니 너무 오래 자지는 않아)
+        # 그 사이에 푸시가 오면 바로 깨어나.
+        sleep_seconds = scheduler.seconds_until_next()
+        if sleep_seconds is None:
+            sleep_seconds = CHECK_INTERVAL_SECONDS
+        await sleep_until_wakeup(min(sleep_seconds, CHECK_INTERVAL_SECONDS))
+
+# --- WebSub (PubSubHubbub) 푸시 받기 ---
+# 유튜브 허브에 채널을 구독해 두면 새 영상/라이브가 생기거나 바뀔 때 허브가 우리 서버로 알려줘.
+# 그러면 몇 초 안에 알림을 보낼 수 있고, 조용할 때는 API를 거의 안 써.
+# WEBSUB_CALLBACK_URL(외부에서 접속 가능한 우리 주소 + /websub)과 WEBSUB_SECRET을 둘 다 설정해야 켜져.
+# (비밀 값이 없으면 아무나 POST 한 번으로 가짜 알림을 넣을 수 있어서 켜지 않아)
+# WEBSUB_HUB_URL을 바꾸면 로컬 가짜 허브로도 테스트할 수 있어.
+WEBSUB_HUB_URL = os.environ.get('WEBSUB_HUB_URL', 'https://pubsubhubbub.appspot.com/subscribe')
+WEBSUB_CALLBACK_URL = os.environ.get('WEBSUB_CALLBACK_URL')
+WEBSUB_SECRET = os.environ.get('WEBSUB_SECRET', '') # 허브가 HMAC 서명할 때 쓰는 비밀 값
+WEBSUB_TOPIC_URL = 'https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}'
+WEBSUB_LEASE_SECONDS = 5 * 24 * 3600 # 구독 기간 요청 값 (허브가 줄일 수도 있어)
+WEBSUB_RENEW_MARGIN_SECONDS = 6 * 3600 # 만료 6시간 전에 다시 구독
+WEBSUB_RENEW_CHECK_SECONDS = 10 * 60 # 구독 상태를 몇 초마다 점검할지
+WEBSUB_RETRY_SECONDS = 5 * 60 # 구독 요청 후 확인이 안 오면 다시 요청할 때까지 기다릴 시간
+WEBSUB_RECONCILE_INTERVAL_SECONDS = 60 * 60 # 푸시 받는 조용한 채널은 1시간에 한 번만 맞춰 봐
+
+websub_leases = {} # 채널 ID -> 구독 만료 시각 (time.time() 기준)
+websub_requested = {} # 채널 ID -> 마지막으로 구독 요청을 보낸 시각
+pushed_videos = {} # 아직 확인 안 한 푸시 영상 (영상 ID -> 채널 ID)
+poll_wakeup = asyncio.Event() # 푸시가 오면 라이브 확인 루프를 깨워
+
+def websub_enabled():
+    return bool(WEBSUB_CALLBACK_URL and WEBSUB_SECRET)
+
+def websub_lease_active(channel_id):
+    return websub_leases.get(channel_id, 0) > time.time()
+
+def channel_id_from_topic(topic):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(topic or '').query)
+    return (query.get('channel_id') or [None])[0]
+
+def handle_websub_verification(args):
+    # 허브가 구독을 확인하려고 GET으로 hub.challenge를 보내면 그대로 돌려줘야 해.
+    # 우리가 감시하는 채널이 아니면 거절 (남이 마음대로 구독시키지 못하게)
+    mode = args.get('hub.mode')
+    channel_id = channel_id_from_topic(args.get('hub.topic'))
+    challenge = args.get('hub.challenge')
+    if not challenge or not channel_id:
+        return None
+    if mode == 'subscribe':
+        # 우리가 구독 요청을 보내고 기다리는 채널만 확인해 줘. (아무나 GET 한 번으로 구독 기간을 늘리지 못하게)
+        if channel_id not in get_watched_channel_ids() or channel_id not in websub_requested:
+            return None
         try:
-            # 인증된 유튜브 서비스 객체 가져오기 (항상 최신 인증 정보로)
-            current_youtube_service = get_authenticated_service_instance()
-
-            # YOUTUBE_CHANNEL_ID는 Secrets에서 가져옵니다.
-            youtube_channel_id = os.environ.get('YOUTUBE_CHANNEL_ID')
-            if not youtube_channel_id:
-                print("경고: YOUTUBE_CHANNEL_ID 환경 변수가 설정되지 않았습니다. 실시간 감지 기능을 사용할 수 없습니다.")
-                await asyncio.sleep(CHECK_INTERVAL_SECONDS) # 잠시 기다렸다가 다시 시도
-                continue # 다음 루프로 건너뛰기
-
-            # 유튜브 API를 호출해서 채널의 라이브 방송 상태를 가져올 거야.
-            request = current_youtube_service.search().list(
-                channelId=youtube_channel_id, # YOUTUBE_CHANNEL_ID 사용
-                eventType='live', # 라이브 중인 비디오만 검색
-                type='video',
-                part='id,snippet',
-                maxResults=1 # 가장 최근 라이브 방송 하나만 가져와
-            )
-            response = request.execute()
-
-            current_live_video = response.get('items')
-
-            if current_live_video and len(current_live_video) > 0:
-                # 라이브 중이야!
-                live_video_id = current_live_video[0]['id']['videoId']
-
-                if not is_live: # 이전에 라이브 중이 아니었는데 지금 라이브가 시작됐다면!
-                    is_live = True
-                    live_start_time = datetime.datetime.now() # 현재 시간을 시작 시간으로 기록!
-                    live_end_time = None # 종료 시간은 초기화
-
-                    # 디스코드에 방송 시작 알림 보내기!
-                    if target_channel_id != 0:
-                        channel = client.get_channel(target_channel_id)
-                        if channel:
-                            await channel.send(
-                                f"🚨 **라이브 방송 시작!** 🚨\n"
-                                f"시작 시간: {live_start_time.strftime('%Y년 %m월 %d일 %H시 %M분 %S초')}\n"
-                                f"지금 바로 보러 가자! ➡️ https://www.youtube.com/watch?v={live_video_id}"
-                            )
-                            print(f"디스코드에 라이브 시작 알림 전송: {live_start_time}")
-                        else:
-                            print(f"오류: 디스코드 채널 ID {target_channel_id}를 찾을 수 없습니다.")
-                    else:
-                        print("경고: 디스코드 메시지를 보낼 채널 ID가 설정되지 않았습니다. `!채널설정` 명령을 사용해주세요.")
-                else:
-                    print("라이브 방송 진행 중...")
+            lease_seconds = int(args.get('hub.lease_seconds') or WEBSUB_LEASE_SECONDS)
+        except ValueError:
+            return None
+        if lease_seconds <= 0:
+            return None
+        # 허브는 요청한 값보다 줄일 수는 있어도 늘릴 수는 없어.
+        lease_seconds = min(lease_seconds, WEBSUB_LEASE_SECONDS)
+        websub_leases[channel_id] = time.time() + lease_seconds
+        websub_requested.pop(channel_id, None)
+        log.info(f"WebSub 구독 확인됨 ({channel_id}, {lease_seconds}초)")
+        return challenge
+    if mode == 'unsubscribe':
+        if channel_id in get_watched_channel_ids():
+            return None
+        websub_leases.pop(channel_id, None)
+        return challenge
+    return None
 
-            else:
-                # 라이브 중이 아니야!
-                if is_live: # 이전에 라이브 중이었는데 지금 라이브가 끝났다면!
-                    is_live = False
-                    live_end_time = datetime.datetime.now() # 현재 시간을 종료 시간으로 기록!
-
-                    # 총 방송 시간 계산!
-                    total_duration = live_end_time - live_start_time
-                    hours = int(total_duration.total_seconds() // 3600)
-                    minutes = int((total_duration.total_seconds() % 3600) // 60)
-                    seconds = int(total_duration.total_seconds() % 60)
-
-                    # 디스코드에 방송 종료 알림 및 총 방송 시간 보내기!
-                    if target_channel_id != 0:
-                        channel = client.get_channel(target_channel_id)
-                        if channel:
-                            response_message = (
-                                f" **라이브 방송 종료!** \n"
-                                f"시작 시간: {live_start_time.strftime('%Y년 %m월 %d일 %H시 %M분 %S초')}\n"
-                                f"종료 시간: {live_end_time.strftime('%Y년 %m월 %d일 %H시 %M분 %S초')}\n"
-                                f"**총 방송 시간: {hours}시간 {minutes}분 {seconds}초**"
-                            )
-                            await channel.send(response_message)
-                            print(f"디스코드에 라이브 종료 알림 및 총 방송 시간 전송: {live_end_time}")
-                        else:
-                            print(f"오류: 디스코드 채널 ID {target_channel_id}를 찾을 수 없습니다.")
-                    else:
-                        print("경고: 디스코드 메시지를 보낼 채널 ID가 설정되지 않았습니다. `!채널설정` 명령을 사용해주세요.")
-                else:
-                    print("라이브 방송 진행 중 아님. 대기 중...")
+def verify_websub_signature(body, signature_header, secret=None):
+    # X-Hub-Signature: sha1=<hex> (유튜브 허브는 sha1을 써)
+    # 비밀 값이 없으면 진짜 허브가 보낸 건지 알 수 없으니까 전부 거절해.
+    secret = WEBSUB_SECRET if secret is None else secret
+    if not secret:
+        return False
+    if not signature_header or '=' not in signature_header:
+        return False
+    algorithm, signature = signature_header.split('=', 1)
+    if algorithm not in ('sha1', 'sha256', 'sha384', 'sha512'):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, getattr(hashlib, algorithm)).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
 
-        except Exception as e:
-            print(f"유튜브 API 호출 중 오류 발생: {e}")
+def parse_websub_feed(body):
+    # Atom 피드에서 (영상 ID, 채널 ID) 목록을 뽑아.
+    ns = {'atom': 'http://www.w3.org/2005/Atom', 'yt': 'http://www.youtube.com/xml/schemas/2015'}
+    feed = ElementTree.fromstring(body)
+    videos = []
+    for entry in feed.findall('atom:entry', ns):
+        video_id = entry.findtext('yt:videoId', namespaces=ns)
+        channel_id = entry.findtext('yt:channelId', namespaces=ns)
+        if video_id and channel_id:
+            videos.append((video_id, channel_id))
+    return videos
+
+def enqueue_pushed_video(video_id, channel_id):
+    # 감시 중인 채널이면 라이브 확인 루프를 깨워.
+    if channel_id in get_watched_channel_ids():
+        pushed_videos[video_id] = channel_id
+        poll_wakeup.set()
+
+def handle_websub_notification(body, signature_header):
+    if not verify_websub_signature(body, signature_header):
+        log.warning("WebSub 알림 서명이 맞지 않아서 무시할게.")
+        return 0
+    try:
+        videos = parse_websub_feed(body)
+    except ElementTree.ParseError as e:
+        log.warning(f"WebSub 알림을 읽을 수 없어: {e}")
+        return 0
+    for video_id, channel_id in videos:
+        log.info(f"WebSub 알림 받음: {video_id} ({channel_id})")
+        enqueue_pushed_video(video_id, channel_id)
+    return len(videos)
+
+def send_websub_subscription(channel_id, mode='subscribe', hub_url=None):
+    # 허브에 구독 요청 보내기 (허브가 나중에 GET으로 확인하러 와)
+    data = {
+        'hub.callback': WEBSUB_CALLBACK_URL,
+        'hub.topic': WEBSUB_TOPIC_URL.format(channel_id=channel_id),
+        'hub.verify': 'async',
+        'hub.mode': mode,
+        'hub.lease_seconds': str(WEBSUB_LEASE_SECONDS),
+        'hub.secret': WEBSUB_SECRET,
+    }
+    req = urllib.request.Request(hub_url or WEBSUB_HUB_URL, data=urllib.parse.urlencode(data).encode('utf-8'))
+    with urllib.request.urlopen(req, timeout=RSS_TIMEOUT_SECONDS) as response:
+        return response.status
 
-        # 다음 확인까지 잠시 기다려.
-        await asyncio.sleep(CHECK_INTERVAL_SECONDS)
+async def renew_websub_subscriptions():
+    # 구독이 없거나 곧 만료되는 채널을 주기적으로 다시 구독해.
+    while True:
+        now = time.time()
+        for channel_id in owned_channel_ids():
+            if websub_leases.get(channel_id, 0) - now > WEBSUB_RENEW_MARGIN_SECONDS:
+                continue
+            if now - websub_requested.get(channel_id, 0) < WEBSUB_RETRY_SECONDS:
+                continue # 이미 요청했고 확인을 기다리는 중
+            websub_requested[channel_id] = now
+            try:
+                await feed_http.run(send_websub_subscription, channel_id)
+                log.info(f"WebSub 구독 요청 보냄 ({channel_id})")
+            except Exception as e:
+                log.warning(f"WebSub 구독 요청 실패 ({channel_id}): {e!r}")
+        await asyncio.sleep(WEBSUB_RENEW_CHECK_SECONDS)
+
+# --- HTTP 서버 (Health Check, 지표, WebSub - 봇을 24시간 돌릴 때 필요해!) ---
+# 예전에는 Flask를 따로 스레드로 돌렸는데, 이제는 봇과 같은 이벤트 루프에서 aiohttp로 돌려.
+# 스레드도 안 늘고, WebSub 알림도 바로 루프에서 처리할 수 있어.
+http_runner = None
 
-# --- Flask Health Check (봇을 24시간 돌릴 때 필요해!) ---
-app = Flask(__name__)
+async def handle_healthz(request):
+    return web.Response(text="OK")
 
-@app.route('/healthz')
-def healthz():
-    return "OK", 200
+async def handle_metrics(request):
+    return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
 
-def run_flask():
+async def handle_websub(request):
+    if request.method == 'GET':
+        challenge = handle_websub_verification(request.query)
+        if challenge is None:
+            return web.Response(status=404, text="Not Found")
+        return web.Response(text=challenge)
+    # 서명이 틀려도 허브가 계속 재전송하지 않게 2xx로 답하고 내용만 무시해.
+    handle_websub_notification(await request.read(), request.headers.get('X-Hub-Signature'))
+    return web.Response(status=204)
+
+def create_http_app():
+    app = web.Application()
+    app.router.add_get('/healthz', handle_healthz)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_route('GET', '/websub', handle_websub)
+    app.router.add_route('POST', '/websub', handle_websub)
+    return app
+
+async def start_http_server():
+    global http_runner
+    if http_runner is not None: # 이미 떠 있으면 또 띄우지 않아
+        return
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port)
+    runner = web.AppRunner(create_http_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    http_runner = runner
+    log.info(f"HTTP 서버 시작됨 (Port: {port}, /healthz /metrics /websub)")
 
-# --- 봇 실행의 시작점 ---
-if __name__ == '__main__':
-    # 봇 시작 시 유튜브 API 서비스 인증을 한 번만 수행
+async def stop_http_server():
+    global http_runner
+    if http_runner is not None:
+        runner, http_runner = http_runner, None
+        await runner.cleanup()
+
+# --- 백그라운드 작업 (딱 하나씩만 돌게!) ---
+# 디스코드가 다시 연결되면 on_ready가 또 불리니까, 작업을 이름별로 하나만 띄우도록 관리해.
+background_tasks = {}
+
+def start_background_task(name, coroutine_function):
+    task = background_tasks.get(name)
+    if task is not None and not task.done():
+        return task
+    task = asyncio.get_running_loop().create_task(coroutine_function(), name=name)
+    background_tasks[name] = task
+    return task
+
+async def warm_up_youtube_service():
+    # 첫 `!링크` 요청이 서비스 객체 만드는 시간을 기다리지 않게 미리 만들어 둬.
+    await youtube_api.run(get_authenticated_service_instance)
+
+async def start_services():
+    await start_http_server()
+    if coordinator is not None:
+        # 다른 프로세스와 채널을 나누고 시작해. (첫 임대를 잡기 전에는 아무 채널도 확인 안 해)
+        try:
+            await sync_channel_leases()
+        except Exception as e:
+            log.error(f"채널 임대 잡기 실패: {e!r}. 잠시 뒤에 다시 시도할게.")
+        start_background_task('lease-keeper', keep_channel_leases)
+        start_background_task('event-relay', relay_live_events)
+        start_background_task('broadcast-sync', sync_broadcast_history)
+    # 디스코드 알림을 보내는 워커들
+    start_background_task('notifier', notifier.run)
+    # 유튜브 라이브 상태 확인 코루틴을 백그라운드에서 실행!
+    start_background_task('live-poller', check_youtube_live_status)
+    if websub_enabled():
+        # WebSub 구독을 만들고 만료 전에 자동으로 갱신!
+        start_background_task('websub-renewer', renew_websub_subscriptions)
+    elif WEBSUB_CALLBACK_URL:
+        log.warning("WEBSUB_SECRET이 설정되지 않아서 WebSub 푸시를 끄고 주기적인 확인만 할게.")
+    # 모아 둔 상태 변경을 주기적으로 저장!
+    start_background_task('state-flusher', flush_state_periodically)
+    # 이벤트 루프가 막히는지 계속 재 봐!
+    start_background_task('loop-lag-monitor', monitor_event_loop_lag)
+    # 인증 토큰이 만료되기 전에 미리 새로고침!
+    start_background_task('token-refresher', refresh_token_periodically)
+    start_background_task('youtube-warmup', warm_up_youtube_service)
+    # `!통계`에 쓸 과거 방송 기록을 천천히 모아!
+    start_background_task('stats-backfill', backfill_watched_channels)
+
+async def stop_services():
+    # 남은 알림을 잠깐 보내 보고, 백그라운드 작업을 멈추고, HTTP 서버를 닫고, 남은 상태를 저장해.
     try:
-        # Replit 환경에서는 초기 인증을 건너뛰고 Secrets에서 바로 불러오도록 합니다.
-        if os.environ.get('REPL_ID') and not os.environ.get('TOKEN_PICKLE_BASE64'):
-            print("Replit 환경입니다. TOKEN_PICKLE_BASE64 Secrets가 설정되어 있어야 합니다.")
-            print("로컬에서 먼저 인증을 완료하고 token.pickle을 Secrets에 넣어주세요.")
-            exit(1) # Replit에서 token.pickle 없으면 종료
+        await asyncio.wait_for(notifier.drain(), NOTIFY_DRAIN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        log.warning("보내지 못한 디스코드 알림이 남아 있는 채로 종료합니다.")
+    tasks = [task for task in background_tasks.values() if not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    background_tasks.clear()
+    await stop_http_server()
+    if state_store:
+        try:
+            await state_store.flush()
+        except Exception as e:
+            log.error(f"상태 저장 중 오류 발생: {e}")
+    if coordinator is not None:
+        # 방송 상태를 저장한 다음에 임대를 내려놓아야 다음 주인이 이어받을 수 있어.
+        await leave_cluster()
 
-        get_authenticated_service_instance()
-        print("유튜브 API 서비스 초기화 완료.")
-    except Exception as e:
-        print(f"유튜브 API 서비스 초기화 실패: {e}")
-        print("client_secret.json 내용이 올바른지, token.pickle이 Secrets에 잘 설정되었는지 확인해주세요.")
-        exit(1)
+# --- 디스코드 봇 이벤트 ---
+# 실제 discord.Client는 봇 실행 시작점에서 만들어서 여기에 넣어. (벤치마크에서는 가짜 클라이언트를 넣어)
+client = None
 
-    # 디스코드 봇 객체 정의 (client.run() 호출 전에 정의되어야 함)
-    intents = discord.Intents.default()
-    intents.message_content = True
-    client = discord.Client(intents=intents)
+async def on_ready():
+    log.info(f'로그인 성공! 봇 이름: {client.user}')
+    log.info('봇이 온라인 상태가 되었어요! 이제 유튜브 링크를 기다릴게! 🔗')
+    log.info("디스코드 알림을 받을 채널에서 `!채널설정` 명령어를 입력해주세요.") # 채널 설정 안내 추가
+    # 디스코드가 다시 연결될 때마다 불리니까, HTTP 서버와 백그라운드 작업은 여기서 띄우지 않아. (setup_hook 참고)
 
-    # --- 디스코드 봇 이벤트 ---
-    @client.event
-    async def on_ready():
-        print(f'로그인 성공! 봇 이름: {client.user}')
-        print('봇이 온라인 상태가 되었어요! 이제 유튜브 링크를 기다릴게! 🔗')
-        print("디스코드 알림을 받을 채널에서 `!채널설정` 명령어를 입력해주세요.") # 채널 설정 안내 추가
 
-        # 봇이 준비되면 Flask Health Check 서버를 백그라운드에서 실행!
-        flask_thread = Thread(target=run_flask)
-        flask_thread.start()
-        print(f"Flask Health Check 서버 시작됨 (Port: {os.environ.get('PORT', 8080)})")
+# --- 명령어 처리 ---
+# 명령어마다 함수 하나씩 만들고, 맨 아래 COMMAND_HANDLERS 표에서 이름으로 바로 찾아.
+# 함수는 (메시지, 명령어 뒤에 붙은 글자)를 받아.
+async def handle_hello_command(message, args):
+    # 봇에게 인사하기!
+    await message.channel.send('안녕! 만나서 반가워! 😊')
 
-        # 유튜브 라이브 상태 확인 코루틴을 백그라운드에서 실행!
-        client.loop.create_task(check_youtube_live_status())
+async def handle_link_command(message, args):
+    # 유튜브 링크 분석 명령어
+    # 링크는 여러 줄로 여러 개 보내도 되고, .txt 파일로 첨부해도 돼.
+    attachment_text = await read_text_attachments(message)
+    if not args.strip() and not attachment_text.strip():
+        await message.channel.send("유튜브 링크를 알려줘! (예: `!링크 https://www.youtube.com/watch?v=xxxxxxxxxxx`)")
+        return
 
+    video_ids = extract_video_ids(args + '\n' + attachment_text)
 
-    @client.event
-    async def on_message(message):
-        global target_channel_id # 전역 변수를 수정할 거라고 알려주는 거야.
-        if message.author == client.user: # 봇 자신이 보낸 메시지는 무시!
-            return
+    if not video_ids:
+        await message.channel.send("유효한 유튜브 링크를 찾을 수 없어. 다시 확인해 줄래?")
+        return
+
+    if len(video_ids) > LINK_COMMAND_MAX_VIDEOS:
+        await message.channel.send(
+            f"링크가 너무 많아! {len(video_ids)}개 중에 앞의 {LINK_COMMAND_MAX_VIDEOS}개만 볼게. "
+            f"나머지는 나눠서 다시 보내 줘."
+        )
+        video_ids = video_ids[:LINK_COMMAND_MAX_VIDEOS]
+
+    if len(video_ids) > 1:
+        await message.channel.send(f"링크 {len(video_ids)}개 분석 중... 잠시만 기다려 줘! 🕵️‍♀️")
+        try:
+            # 캐시에 없는 영상만 50개씩 묶어서 한 번에 조회해.
+            videos = await video_info_cache.get_many(video_ids, fetch_video_infos, VIDEOS_LIST_BATCH_SIZE)
+            for report in build_bulk_link_report(video_ids, videos):
+                await message.channel.send(report)
+        except asyncio.TimeoutError:
+            log.warning(f"링크 {len(video_ids)}개 처리 시간 초과")
+            await message.channel.send("유튜브 응답이 너무 늦어. 잠시 후에 다시 시도해 줄래? ⏳")
+        except Exception as e:
+            log.error(f"링크 처리 중 오류 발생: {e}")
+            await message.channel.send(f"링크 처리 중 문제가 발생했어! ㅠㅠ 오류 내용: `{e}`")
+        return
+
+    video_id = video_ids[0]
+    await message.channel.send(f"링크 분석 중... 잠시만 기다려 줘! 🕵️‍♀️")
 
-        # 봇에게 인사하기!
-        if message.content == '!안녕':
-            await message.channel.send('안녕! 만나서 반가워! 😊')
+    try:
+        # 같은 영상은 캐시에서 꺼내고, 동시에 여러 명이 물어보면 API는 한 번만 불러.
+        video_data = await video_info_cache.get(video_id, fetch_video_info)
+
+        if video_data is None:
+            await message.channel.send("해당 영상 정보를 찾을 수 없어. 링크가 정확한지 확인해 줘.")
             return
 
-        # 유튜브 링크 분석 명령어
-        if message.content.startswith('!링크'):
-            parts = message.content.split(' ', 1)
-            if len(parts) < 2:
-                await message.channel.send("유튜브 링크를 알려줘! (예: `!링크 https://www.youtube.com/watch?v=xxxxxxxxxxx`)")
-                return
+        snippet = video_data.get('snippet', {})
+        live_details = video_data.get('liveStreamingDetails', {})
 
-            youtube_url = parts[1]
-            video_id = extract_video_id(youtube_url)
+        title = snippet.get('title', '제목 없음')
 
-            if not video_id:
-                await message.channel.send("유효한 유튜브 링크를 찾을 수 없어. 다시 확인해 줄래?")
-                return
+        if 'actualStartTime' in live_details and 'actualEndTime' in live_details:
+            start_time_iso = live_details['actualStartTime']
+            end_time_iso = live_details['actualEndTime']
 
-            await message.channel.send(f"링크 분석 중... 잠시만 기다려 줘! 🕵️‍♀️")
+            start_dt_utc = parse_youtube_time(start_time_iso)
+            end_dt_utc = parse_youtube_time(end_time_iso)
 
-            try:
-                # 인증된 유튜브 서비스 객체 사용
-                current_youtube_service = get_authenticated_service_instance() # 항상 최신 인증 정보로 서비스 가져오기
-                video_response = current_youtube_service.videos().list(
-                    part='snippet,liveStreamingDetails',
-                    id=video_id
-                ).execute()
-
-                if not video_response['items']:
-                    await message.channel.send("해당 영상 정보를 찾을 수 없어. 링크가 정확한지 확인해 줘.")
-                    return
-
-                video_data = video_response['items'][0]
-                snippet = video_data.get('snippet', {})
-                live_details = video_data.get('liveStreamingDetails', {})
-
-                title = snippet.get('title', '제목 없음')
-
-                if 'actualStartTime' in live_details and 'actualEndTime' in live_details:
-                    start_time_iso = live_details['actualStartTime']
-                    end_time_iso = live_details['actualEndTime']
-
-                    start_dt_utc = datetime.datetime.fromisoformat(start_time_iso.replace('Z', '+00:00'))
-                    end_dt_utc = datetime.datetime.fromisoformat(end_time_iso.replace('Z', '+00:00'))
-
-                    kst_tz = pytz.timezone('Asia/Seoul')
-                    start_dt_kst = start_dt_utc.astimezone(kst_tz)
-                    end_dt_kst = end_dt_utc.astimezone(kst_tz)
-
-                    duration = end_dt_utc - start_dt_utc
-                    total_seconds = int(duration.total_seconds())
-                    hours = total_seconds // 3600
-                    minutes = (total_seconds % 3600) // 60
-                    seconds = total_seconds % 60
-
-                    response_message = (
-                        f"** 영상 제목:** {title}\n"
-                        f"** 날짜:** {start_dt_kst.strftime('%m/%d')}\n"
-                        f"** 방송 시작:** {start_dt_kst.strftime('%H:%M')}\n"
-                        f"** 방송 종료:** {end_dt_kst.strftime('%H:%M')}\n"
-                        f"** 총 방송 시간:** {hours}시간 {minutes}분 {seconds}초"
-                    )
-                elif 'scheduledStartTime' in live_details and 'actualStartTime' not in live_details:
-                    response_message = (
-                        f"'{title}' 영상은 아직 시작하지 않은 라이브 방송이거나, 현재 진행 중인 라이브 방송이야. 😅\n"
-                        f"방송이 종료된 후에 다시 링크를 알려주면 정확한 시간을 알려줄 수 있어!"
-                    )
-                elif 'actualStartTime' in live_details and 'actualEndTime' not in live_details:
-                    response_message = (
-                        f"'{title}' 영상은 현재 진행 중인 라이브 방송이야! 🤩\n"
-                        f"방송이 종료된 후에 다시 링크를 알려주면 총 방송 시간을 계산해 줄게!"
-                    )
-                else:
-                    response_message = (
-                        f"'{title}' 영상은 라이브 스트리밍 정보가 없거나, 일반 영상인 것 같아. 😥\n"
-                        f"라이브 방송이었는지 다시 한번 확인해 줄래?"
-                    )
-
-                await message.channel.send(response_message)
+            start_dt_kst = start_dt_utc.astimezone(KST)
+            end_dt_kst = end_dt_utc.astimezone(KST)
 
-            except Exception as e:
-                print(f"링크 처리 중 오류 발생: {e}")
-                await message.channel.send(f"링크 처리 중 문제가 발생했어! ㅠㅠ 오류 내용: `{e}`")
-        
-        # 봇이 알림을 보낼 디스코드 채널 설정하기
-        if message.content == '!채널설정':
-            # 메시지를 보낸 채널의 ID를 저장!
-            target_channel_id = message.channel.id
-            await message.channel.send(f"앞으로 유튜브 라이브 알림은 이 채널({message.channel.name})로 보낼게! (채널 ID: `{target_channel_id}`)")
-            print(f"디스코드 알림 채널이 {message.channel.name} (ID: {target_channel_id})로 설정되었습니다.")
-            return # 이 명령어 처리 후 함수 종료
+            duration = end_dt_utc - start_dt_utc
+            total_seconds = int(duration.total_seconds())
+
+            response_message = (
+                f"** 영상 제목:** {title}\n"
+                f"** 날짜:** {start_dt_kst.strftime('%m/%d')}\n"
+                f"** 방송 시작:** {start_dt_kst.strftime('%H:%M')}\n"
+                f"** 방송 종료:** {end_dt_kst.strftime('%H:%M')}\n"
+                f"** 총 방송 시간:** {format_duration(total_seconds)}"
+            )
+        elif 'scheduledStartTime' in live_details and 'actualStartTime' not in live_details:
+            response_message = (
+                f"'{title}' 영상은 아직 시작하지 않은 라이브 방송이거나, 현재 진행 중인 라이브 방송이야. 😅\n"
+                f"방송이 종료된 후에 다시 링크를 알려주면 정확한 시간을 알려줄 수 있어!"
+            )
+        elif 'actualStartTime' in live_details and 'actualEndTime' not in live_details:
+            response_message = (
+                f"'{title}' 영상은 현재 진행 중인 라이브 방송이야! 🤩\n"
+                f"방송이 종료된 후에 다시 링크를 알려주면 총 방송 시간을 계산해 줄게!"
+            )
+        else:
+            response_message = (
+                f"'{title}' 영상은 라이브 스트리밍 정보가 없거나, 일반 영상인 것 같아. 😥\n"
+                f"라이브 방송이었는지 다시 한번 확인해 줄래?"
+            )
+
+        await message.channel.send(response_message)
+
+    except asyncio.TimeoutError:
+        log.warning(f"링크 처리 시간 초과: {video_id}")
+        await message.channel.send("유튜브 응답이 너무 늦어. 잠시 후에 다시 시도해 줄래? ⏳")
+    except Exception as e:
+        log.error(f"링크 처리 중 오류 발생: {e}")
+        await message.channel.send(f"링크 처리 중 문제가 발생했어! ㅠㅠ 오류 내용: `{e}`")
+
+async def handle_cache_command(message, args):
+    # 영상 정보 캐시 상태 보기
+    stats = video_info_cache.stats()
+    await message.channel.send(
+        f"**영상 정보 캐시** (최대 {video_info_cache.max_size}개)\n"
+        f"저장된 영상: {stats['size']}개\n"
+        f"적중: {stats['hits']}번 / 같이 기다림: {stats['coalesced']}번 / API 호출: {stats['misses']}번\n"
+        f"밀려난 항목: {stats['evictions']}개\n"
+        f"적중률: {stats['hit_rate'] * 100:.1f}%"
+    )
+
+async def handle_stats_command(message, args):
+    # 방송 통계 보기 (예: `!통계`, `!통계 주`, `!통계 일 UCxxxx`)
+    period = 'month'
+    channel_ids = get_watched_channel_ids()
+    for arg in args.split():
+        if arg in STATS_PERIODS:
+            period = STATS_PERIODS[arg]
+        else:
+            channel_ids = [arg]
+    if not channel_ids:
+        await message.channel.send("감시 중인 유튜브 채널이 없어. `YOUTUBE_CHANNEL_IDS`를 설정해 줘!")
+        return
+    # 미리 더해 둔 합계만 읽으니까 유튜브 API는 안 불러.
+    for report in build_stats_report(channel_ids, period):
+        await message.channel.send(report)
+
+async def handle_set_alert_channel_command(message, args):
+    # 봇이 알림을 보낼 디스코드 채널 설정하기
+    # 메시지를 보낸 채널의 ID를 저장!
+    guild_id = message.guild.id if message.guild else 0
+    alert_channels[guild_id] = message.channel.id
+    state_store.set_alert_channel(guild_id, message.channel.id)
+    await state_store.flush() # 자주 쓰는 명령이 아니니까 바로 저장해 둘게.
+    await message.channel.send(f"앞으로 유튜브 라이브 알림은 이 채널({message.channel.name})로 보낼게! (채널 ID: `{message.channel.id}`)")
+    log.info(f"디스코드 알림 채널이 {message.channel.name} (ID: {message.channel.id})로 설정되었습니다.")
+
+COMMAND_PREFIX = '!'
+COMMAND_HANDLERS = {
+    '!안녕': handle_hello_command,
+    '!링크': handle_link_command,
+    '!캐시': handle_cache_command,
+    '!통계': handle_stats_command,
+    '!채널설정': handle_set_alert_channel_command,
+}
+# 명령어는 첫 단어야. (`!안녕하세요`는 `!안녕`이 아니야)
+COMMAND_RE = re.compile('(?:' + '|'.join(re.escape(name) for name in COMMAND_HANDLERS) + r')(?=\s|$)')
+
+async def on_message(message):
+    content = message.content
+    # 대부분의 메시지는 명령어가 아니니까 글자 하나만 보고 바로 끝내.
+    if not content.startswith(COMMAND_PREFIX):
+        return
+    if message.author == client.user: # 봇 자신이 보낸 메시지는 무시!
+        return
+    match = COMMAND_RE.match(content)
+    if match is None:
+        return
+    command = match.group()
+    COMMANDS.labels(command=command).inc()
+    await COMMAND_HANDLERS[command](message, content[match.end():])
+
+class TimeBotHooks:
+    async def setup_hook(self):
+        # 로그인 전에 딱 한 번 불려. HTTP 서버와 백그라운드 작업을 여기서 띄워.
+        # client.run()은 Ctrl-C만 정리해 주니까, 배포할 때 오는 SIGTERM도 똑같이 정상 종료하게 해.
+        # (안 그러면 남은 알림, 마지막 몇 초의 상태 저장, 채널 임대 반납이 전부 날아가)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.close_on_signal)
+        except NotImplementedError:
+            pass # 윈도우는 이벤트 루프 시그널 처리를 지원하지 않아
+        await start_services()
+
+    def close_on_signal(self):
+        log.info("SIGTERM을 받아서 봇을 종료합니다.")
+        self._close_task = asyncio.ensure_future(self.close())
+
+    async def close(self):
+        await stop_services()
+        await super().close()
+
+class TimeBotClient(TimeBotHooks, discord.Client):
+    pass
+
+class ShardedTimeBotClient(TimeBotHooks, discord.AutoShardedClient):
+    pass
+
+# --- 디스코드 샤딩 ---
+# 서버가 많아지면 디스코드 연결을 샤드로 나눠.
+#   DISCORD_SHARD_COUNT=4                      # 한 프로세스가 샤드 4개를 전부 연결
+#   DISCORD_SHARD_COUNT=4 DISCORD_SHARD_IDS=0,1 # 이 프로세스는 0, 1번만 (다른 프로세스가 2, 3번)
+#   DISCORD_AUTO_SHARD=1                       # 샤드 수를 디스코드가 추천하는 값으로
+# 여러 프로세스로 나눌 때는 SCALE_OUT=1, 같은 STATE_DB_PATH, 프로세스마다 다른 WORKER_ID/DISCORD_SHARD_IDS를 줘.
+DISCORD_SHARD_COUNT = int(os.environ['DISCORD_SHARD_COUNT']) if os.environ.get('DISCORD_SHARD_COUNT') else None
+DISCORD_SHARD_IDS = [int(shard_id) for shard_id in re.split(r'[\s,]+', os.environ.get('DISCORD_SHARD_IDS', '')) if shard_id] or None
+DISCORD_AUTO_SHARD = os.environ.get('DISCORD_AUTO_SHARD') == '1'
+
+def create_discord_client(intents):
+    if DISCORD_SHARD_IDS is not None:
+        if DISCORD_SHARD_COUNT is None:
+            raise ValueError("DISCORD_SHARD_IDS를 쓰려면 DISCORD_SHARD_COUNT도 설정해야 합니다.")
+        log.info(f"디스코드 샤드 {DISCORD_SHARD_IDS} / 전체 {DISCORD_SHARD_COUNT}개를 연결합니다.")
+        return ShardedTimeBotClient(intents=intents, shard_count=DISCORD_SHARD_COUNT, shard_ids=DISCORD_SHARD_IDS)
+    if DISCORD_SHARD_COUNT is not None or DISCORD_AUTO_SHARD:
+        log.info(f"디스코드 샤드를 전부 연결합니다. (샤드 수: {DISCORD_SHARD_COUNT or '자동'})")
+        return ShardedTimeBotClient(intents=intents, shard_count=DISCORD_SHARD_COUNT)
+    return TimeBotClient(intents=intents)
+
+# --- 봇 실행의 시작점 ---
+if __name__ == '__main__':
+    setup_logging()
+
+    # 샤드를 안 나누면 프로세스마다 모든 서버에 같은 알림을 보내게 돼서, 인증하기 전에 아예 시작을 막아.
+    if SCALE_OUT and DISCORD_SHARD_IDS is None:
+        log.error("SCALE_OUT=1이면 DISCORD_SHARD_IDS(와 DISCORD_SHARD_COUNT)를 프로세스마다 겹치지 않게 설정해야 합니다.")
+        exit(1)
+
+    # 봇 시작 시 유튜브 API 서비스 인증을 한 번만 수행
+    try:
+        # Replit 환경에서는 초기 인증을 건너뛰고 Secrets에서 바로 불러오도록 합니다.
+        if os.environ.get('REPL_ID') and not os.environ.get('TOKEN_PICKLE_BASE64'):
+            log.error("Replit 환경입니다. TOKEN_PICKLE_BASE64 Secrets가 설정되어 있어야 합니다.")
+            log.error("로컬에서 먼저 인증을 완료하고 token.pickle을 Secrets에 넣어주세요.")
+            exit(1) # Replit에서 token.pickle 없으면 종료
+
+        # 인증 정보만 먼저 확인하고, 서비스 객체는 로그인하는 동안 백그라운드에서 만들어.
+        get_youtube_credentials()
+        log.info("유튜브 인증 정보 확인 완료.")
+    except Exception as e:
+        log.error(f"유튜브 API 서비스 초기화 실패: {e}")
+        log.error("client_secret.json 내용이 올바른지, token.pickle이 Secrets에 잘 설정되었는지 확인해주세요.")
+        exit(1)
+
+    # 저장해 둔 알림 채널과 라이브 상태 불러오기 (재시작해도 이어서!)
+    state_store = StateStore(STATE_DB_PATH)
+    alert_channels, live_sessions = state_store.load()
+    notifier.load_sent(state_store.load_sent_notifications())
+    load_broadcast_history(state_store)
+    log.info(f"저장된 상태 불러오기 완료: 알림 채널 {len(alert_channels)}개, 방송 중 {len(live_sessions)}개, "
+             f"방송 기록 {len(broadcast_stats)}개")
+
+    # 여러 프로세스로 나눠 돌리기 (같은 DB 파일로 채널 임대를 주고받아)
+    if SCALE_OUT:
+        coordinator = ChannelLeaseCoordinator(STATE_DB_PATH, WORKER_ID)
+        log.info(f"스케일 아웃 모드: 프로세스 ID {WORKER_ID}")
+
+    # 디스코드 봇 객체 정의 (client.run() 호출 전에 정의되어야 함)
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = create_discord_client(intents)
+
+    # 디스코드 봇 이벤트 연결
+    client.event(on_ready)
+    client.event(on_message)
 
     # 디스코드 봇을 실행!
-    client.run(DISCORD_TOKEN)
+    try:
+        client.run(DISCORD_TOKEN)
+    finally:
+        youtube_api.close() # 남아 있는 API 요청 스레드 정리
+        feed_http.close()
+        state_store.close() # 아직 저장 안 한 상태까지 저장
+        if coordinator is not None:
+            coordinator.close()